@@ -0,0 +1,184 @@
+"""
+Tier 3 embedding backends: throughput, memory and recall regression.
+
+Run from the repo root:
+    python -m benchmarks.bench_embeddings [--backends torch onnx onnx-int8 onnx-int8:d512 onnx-int8:bin]
+                                          [--docs data/docs] [--queries 200] [--k 5] [--min-agreement 0.9]
+
+A spec is BACKEND[:dDIM][:bin] (see modules/embedding_backends.py). The first spec is
+the reference. Each spec runs in its own subprocess so its peak RSS and model load
+time are measured in isolation; all of them embed the same chunks and queries.
+
+Quality is measured two ways on the chunked corpus (data/docs, else a synthetic one):
+  hit@k        self-retrieval: a query cut from the middle of a chunk should find that chunk
+  agreement@k  overlap of each query's top-k with the reference backend's top-k
+--min-agreement turns the run into a regression gate (exit code 1 below the floor).
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from modules.chunker import chunk_text
+
+def parse_spec(spec):
+    backend, dim, binary = spec.split(":")[0], None, False
+    for part in spec.split(":")[1:]:
+        if part == "bin":
+            binary = True
+        elif part.startswith("d"):
+            dim = int(part[1:])
+        else:
+            raise ValueError(f"Bad backend spec {spec!r}")
+    return backend, dim, binary
+
+def load_corpus(docs_dir, limit):
+    texts = []
+    if docs_dir and os.path.isdir(docs_dir):
+        for name in sorted(os.listdir(docs_dir)):
+            if name.lower().endswith((".txt", ".md")):
+                with open(os.path.join(docs_dir, name), "r", encoding="utf-8", errors="ignore") as f:
+                    texts.extend(chunk["text"] for chunk in chunk_text(f.read()))
+    if not texts:
+        from benchmarks.bench_ingest import build_corpus
+        synthetic = tempfile.mkdtemp(prefix="nexus_embed_bench_")
+        build_corpus(synthetic, 200, 0)
+        return load_corpus(synthetic, limit)
+    return texts[:limit]
+
+def make_queries(chunks, n, seed=11):
+    """(query, target chunk index): ~12 words from the middle of a random chunk."""
+    rng = random.Random(seed)
+    queries = []
+    for index in rng.sample(range(len(chunks)), min(n, len(chunks))):
+        words = chunks[index].split()
+        start = max(0, len(words) // 2 - 6)
+        queries.append((" ".join(words[start:start + 12]), index))
+    return queries
+
+# --- WORKER (one backend per process) ---
+
+def run_worker(spec, workload_path, out_path, batch_size):
+    from modules.embedding_backends import load_embedding_function
+    with open(workload_path, "r", encoding="utf-8") as f:
+        workload = json.load(f)
+    backend, dim, binary = parse_spec(spec)
+
+    started = time.perf_counter()
+    ef = load_embedding_function(backend=backend, dim=dim, binary=binary)
+    load_s = time.perf_counter() - started
+
+    chunks = workload["chunks"]
+    started = time.perf_counter()
+    corpus = []
+    for i in range(0, len(chunks), batch_size):
+        corpus.extend(ef(chunks[i:i + batch_size]))
+    corpus_s = time.perf_counter() - started
+
+    # Queries one at a time, like /vault
+    latencies, queries = [], []
+    for query in workload["queries"]:
+        started = time.perf_counter()
+        queries.append(ef([query])[0])
+        latencies.append(time.perf_counter() - started)
+
+    np.savez(out_path, corpus=np.asarray(corpus, dtype=np.float32), queries=np.asarray(queries, dtype=np.float32))
+    print(json.dumps({
+        "load_s": load_s,
+        "chunks_per_s": len(chunks) / corpus_s if corpus_s else 0.0,
+        "query_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "query_p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB on Linux
+    }))
+
+# --- PARENT ---
+
+def top_k(corpus, queries, k):
+    corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+def run(specs, docs_dir, n_chunks, n_queries, k, batch_size):
+    chunks = load_corpus(docs_dir, n_chunks)
+    queries = make_queries(chunks, n_queries)
+    scratch = tempfile.mkdtemp(prefix="nexus_embed_bench_")
+    workload_path = os.path.join(scratch, "workload.json")
+    with open(workload_path, "w", encoding="utf-8") as f:
+        json.dump({"chunks": chunks, "queries": [q for q, _ in queries]}, f)
+    targets = np.asarray([t for _, t in queries])
+
+    results, reference = [], None
+    for spec in specs:
+        out_path = os.path.join(scratch, f"{spec.replace(':', '_')}.npz")
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_embeddings", "--worker", spec,
+             "--workload", workload_path, "--out", out_path, "--batch-size", str(batch_size)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"[!] {spec}: worker failed\n{proc.stderr.strip()[-2000:]}")
+            continue
+        stats = json.loads(proc.stdout.strip().splitlines()[-1])
+        vectors = np.load(out_path)
+        ranked = top_k(vectors["corpus"], vectors["queries"], k)
+        if reference is None:
+            reference = {"ranked": ranked, "stats": stats}
+        agreement = np.mean([len(set(a) & set(b)) / k for a, b in zip(ranked, reference["ranked"])])
+        stats.update({
+            "spec": spec,
+            "dims": int(vectors["corpus"].shape[1]),
+            "hit_at_k": float(np.mean([t in row for t, row in zip(targets, ranked)])),
+            "agreement_at_k": float(agreement),
+            "speedup": stats["chunks_per_s"] / reference["stats"]["chunks_per_s"]
+                       if reference["stats"]["chunks_per_s"] else 0.0,
+        })
+        results.append(stats)
+    return {"chunks": len(chunks), "queries": len(queries), "k": k, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8", "onnx-int8:d512"])
+    parser.add_argument("--docs", default=os.path.join("data", "docs"))
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="Fail if any backend's agreement@k with the reference falls below this")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--workload", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.workload, args.out, args.batch_size)
+        return
+
+    report = run(args.backends, args.docs, args.chunks, args.queries, args.k, args.batch_size)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['chunks']} chunks, {report['queries']} queries, k={report['k']} "
+              f"(reference: {args.backends[0]})")
+        print(f"{'backend':<22}{'dims':>6}{'chunks/s':>10}{'speedup':>9}{'query p50':>11}"
+              f"{'load s':>8}{'RSS MB':>8}{'hit@k':>7}{'agree@k':>9}")
+        for r in report["results"]:
+            print(f"{r['spec']:<22}{r['dims']:>6}{r['chunks_per_s']:>10.1f}{r['speedup']:>8.2f}x"
+                  f"{r['query_p50_ms']:>9.1f}ms{r['load_s']:>8.1f}{r['peak_rss_mb']:>8.0f}"
+                  f"{r['hit_at_k']:>7.2f}{r['agreement_at_k']:>9.2f}")
+
+    if args.min_agreement is not None:
+        failing = [r["spec"] for r in report["results"] if r["agreement_at_k"] < args.min_agreement]
+        if failing or len(report["results"]) < len(args.backends):
+            print(f"[!] Recall regression: {', '.join(failing) or 'worker failure'} "
+                  f"below agreement@k {args.min_agreement}.")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
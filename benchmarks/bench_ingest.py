@@ -0,0 +1,44 @@
+"""
+Tier 3 ingestion benchmark on a synthetic corpus.
+Reports files/sec for the pipelined sync_docs_folder.
+
+Run from the repo root:
+    python -m benchmarks.bench_ingest [N_FILES] [--images N] [--hash-embed]
+
+--hash-embed swaps the SentenceTransformer for a trivial hashing embedder so the
+pipeline itself (hashing, OCR, batching, throttling) is measured in isolation.
+"""
+import argparse
+import os
+import tempfile
+import chromadb
+from modules import ingest_handler
+from benchmarks.synthetic import HashEmbedding, build_corpus
+
+def run(n_files, n_images, hash_embed):
+    docs_dir = tempfile.mkdtemp(prefix="nexus_ingest_bench_")
+    build_corpus(docs_dir, n_files, n_images)
+
+    if hash_embed:
+        ef = HashEmbedding()
+    else:
+        from modules.vault_engine import cpu_ef as ef
+    collection = chromadb.EphemeralClient().get_or_create_collection(
+        name="bench_vault", embedding_function=ef, metadata={"hnsw:space": "cosine"}
+    )
+
+    manifest_path = os.path.join(tempfile.mkdtemp(prefix="nexus_manifest_bench_"), "manifest.db")
+
+    print(f"\n--- Tier 3 Ingestion Benchmark ({n_files} txt + {n_images} png in {docs_dir}) ---")
+    cold = ingest_handler.sync_docs_folder(docs_dir=docs_dir, collection=collection, manifest_path=manifest_path)
+    warm = ingest_handler.sync_docs_folder(docs_dir=docs_dir, collection=collection, manifest_path=manifest_path)
+    print(f"Cold ingest:  {cold['files_per_sec']:.1f} files/s ({cold['seconds']:.2f}s, {cold['throttled']:.1f}s throttled)")
+    print(f"Re-sync:      {warm['files_per_sec']:.1f} files/s ({warm['seconds'] * 1000:.1f} ms, stat-only via manifest)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n_files", nargs="?", type=int, default=500)
+    parser.add_argument("--images", type=int, default=0)
+    parser.add_argument("--hash-embed", action="store_true")
+    args = parser.parse_args()
+    run(args.n_files, args.images, args.hash_embed)
@@ -0,0 +1,83 @@
+"""
+Tier 2 ledger microbenchmark.
+Compares the old connect-per-call pattern with the pooled Ledger object.
+
+Run from the repo root:  python -m benchmarks.bench_ledger [N]
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+import time
+from modules.ledger_mgr import Ledger, SQL_INSERT_SUMMARY, build_fts_query, summary_row
+
+SQL_RECALL_PROBE = '''
+    SELECT s.content, s.timestamp FROM session_summaries_fts
+    JOIN session_summaries AS s ON s.id = session_summaries_fts.rowid
+    WHERE session_summaries_fts MATCH ? AND s.is_archived = 0
+    LIMIT 50
+'''
+
+def timed(label, n, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<38} {elapsed * 1e6 / n:>9.1f} us/call  ({n} calls)")
+    return elapsed
+
+def legacy_save(db_path, content):
+    # Mirrors the pre-pool save_summary: open, insert, commit, close
+    conn = sqlite3.connect(db_path)
+    conn.execute(SQL_INSERT_SUMMARY, summary_row(content))
+    conn.commit()
+    conn.close()
+
+def legacy_recall(db_path, query_text):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(SQL_RECALL_PROBE, (build_fts_query(query_text),)).fetchall()
+    conn.close()
+    return rows
+
+def run(n=2000):
+    workdir = tempfile.mkdtemp(prefix="nexus_ledger_bench_")
+    legacy_db = os.path.join(workdir, "legacy.db")
+    pooled_db = os.path.join(workdir, "pooled.db")
+
+    for path in (legacy_db, pooled_db):
+        ledger = Ledger(path)
+        ledger.initialize()
+        ledger.close()
+
+    print(f"\n--- Tier 2 Ledger Benchmark ({workdir}) ---")
+    timed("save_summary  (connect per call)", n,
+          lambda: [legacy_save(legacy_db, f"legacy fact {i} about the budget") for i in range(n)])
+
+    ledger = Ledger(pooled_db)
+    timed("save_summary  (pooled writer)", n,
+          lambda: [ledger.save_summary(f"pooled fact {i} about the budget") for i in range(n)])
+    timed("save_summaries (one batch)", n,
+          lambda: ledger.save_summaries([f"batched fact {i} about the budget" for i in range(n)]))
+
+    reads = max(1, n // 4)
+    timed("recall FTS    (connect per call)", reads,
+          lambda: [legacy_recall(legacy_db, "budget fact") for _ in range(reads)])
+    timed("recall FTS    (reader pool)", reads,
+          lambda: [ledger._read(SQL_RECALL_PROBE, (build_fts_query("budget fact"),)) for _ in range(reads)])
+
+    # Concurrent prune threads: every write must land, none may fail with "database is locked"
+    errors = []
+    def prune_thread(t):
+        try:
+            for i in range(n // 8):
+                ledger.save_summary(f"thread {t} fact {i}")
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=prune_thread, args=(t,)) for t in range(8)]
+    timed("save_summary  (8 concurrent threads)", (n // 8) * 8,
+          lambda: ([t.start() for t in threads], [t.join() for t in threads]))
+    ledger.close()
+    print(f"Concurrent write errors: {len(errors)}")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,59 @@
+"""
+Prompt-eval cost vs. history length: flat generate() prompt vs. KV-cache friendly chat mode.
+Needs a running Ollama (or anything speaking its API, see --host).
+
+Run from the repo root:  python -m benchmarks.bench_prompt_eval [--turns 0 4 8 16 32] [--host URL]
+
+For each history length the conversation is replayed turn by turn, as the REPL would,
+and the prompt_eval_count / prompt_eval_duration Ollama reports for the *last* turn is
+recorded. In flat mode the time line at the top of the persona changes the prefix; in
+chat mode only the newest turn should need evaluating.
+"""
+import argparse
+import json
+import ollama
+from modules import inference
+from modules.identity import current_time
+from benchmarks.synthetic import synthetic_history
+
+PERSONA = "\n[SYSTEM OVERHEAD / TIER 0]\nUser: Sir\nAssistant: ALFRED\n\nRULES: Be concise.\n"
+BENCH_OPTIONS = {"num_predict": 8, "temperature": 0.0}
+
+def flat_turn(client, history, minute):
+    persona = PERSONA.replace("[SYSTEM OVERHEAD / TIER 0]\n", f"[SYSTEM OVERHEAD / TIER 0]\nCurrent Time: {minute}\n")
+    context = "No external documents loaded.\n\n### HISTORY ###\n" + "\n".join(history)
+    return client.generate(model=inference.MODEL_NAME, prompt=inference.build_prompt(persona, context, "And next?"),
+                           options=BENCH_OPTIONS, keep_alive='1h')
+
+def chat_turn(client, history, minute):
+    volatile = f"Current Time: {minute}\nNo external documents loaded."
+    return client.chat(model=inference.MODEL_NAME,
+                       messages=inference.build_messages(PERSONA, history, volatile, "And next?"),
+                       options=BENCH_OPTIONS, keep_alive='1h')
+
+def measure(turn_fn, client, n_turns):
+    history = synthetic_history(n_turns)
+    # Replay the conversation so the server's KV cache holds the previous turn, like a live session
+    for i in range(0, len(history), 2):
+        turn_fn(client, history[:i], f"{current_time()} (+{i // 2}m)")
+    final = turn_fn(client, history, f"{current_time()} (+{n_turns}m)")
+    return final.get('prompt_eval_count') or 0, (final.get('prompt_eval_duration') or 0) / 1e6
+
+def run(turns, host):
+    client = ollama.Client(host=host) if host else ollama
+    results = []
+    print(f"{'turns':>6}{'flat tok':>10}{'flat ms':>10}{'chat tok':>10}{'chat ms':>10}")
+    for n in turns:
+        flat_tok, flat_ms = measure(flat_turn, client, n)
+        chat_tok, chat_ms = measure(chat_turn, client, n)
+        print(f"{n:>6}{flat_tok:>10}{flat_ms:>10.1f}{chat_tok:>10}{chat_ms:>10.1f}")
+        results.append({"turns": n, "flat_tokens": flat_tok, "flat_ms": flat_ms,
+                        "chat_tokens": chat_tok, "chat_ms": chat_ms})
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, nargs="+", default=[0, 4, 8, 16, 32])
+    parser.add_argument("--host", default=None)
+    args = parser.parse_args()
+    run(args.turns, args.host)
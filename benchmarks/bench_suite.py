@@ -0,0 +1,229 @@
+"""
+Offline benchmark suite: the hot paths on synthetic data against a fake Ollama.
+No network and no model download (the hashing embedder is the default).
+
+Run from the repo root:
+    python -m benchmarks.bench_suite [--files 200] [--images 10] [--summaries 5000] [--queries 100]
+                                     [--turns 20] [--real-embed] [--out run.json]
+                                     [--compare baseline.json] [--tolerance 0.25]
+
+Stages, each reported as n / p50 / p95 / mean ms (ingest as files/s):
+    ingest        cold sync_docs_folder of the generated corpus (text + OCR images)
+    vault_query   query_vault over the ingested corpus
+    recall        recall_memory over a ledger of --summaries rows
+    token_guard   per-turn token bookkeeping: history append, elastic guard, packer
+    turn          end to end through NexusOrchestrator.handle (prefetch included)
+
+Everything runs in a temporary working directory, so data/ is never touched.
+The JSON on stdout (or --out) is comparable across runs: with --compare, a stage
+whose p50/p95 grew (or throughput fell) by more than --tolerance is reported and
+the exit status is 1. Stages whose dependency is missing are recorded as skipped.
+Fake-model latency flags are shared with benchmarks.fake_ollama.
+"""
+import os
+os.environ.setdefault("NEXUS_RESPONSE_CACHE", "0")   # Every turn must reach the fake model
+os.environ.setdefault("NEXUS_EMBED_CACHE", "0")      # Cold embeddings, like a first run
+
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import sys
+import tempfile
+import time
+from benchmarks.fake_ollama import add_latency_args, latency_config, start_fake_ollama
+from benchmarks.synthetic import HashEmbedding, build_corpus, build_ledger, make_queries, synthetic_history
+
+def summarize(samples):
+    """Seconds -> {n, p50_ms, p95_ms, mean_ms}."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"n": 0}
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"n": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95),
+            "mean_ms": sum(ordered) / len(ordered) * 1000}
+
+def time_each(fn, items):
+    samples = []
+    for item in items:
+        started = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+# --- STAGES ---
+
+def stage_ingest(args, workdir):
+    from modules import ingest_handler
+    from modules.vault_engine import get_vault
+    docs_dir = os.path.join(workdir, "corpus")
+    os.makedirs(docs_dir)
+    try:
+        build_corpus(docs_dir, args.files, args.images)
+    except ImportError:
+        print("[!] Pillow not installed; corpus is text-only.", file=sys.stderr)
+    totals = ingest_handler.sync_docs_folder(docs_dir=docs_dir, collection=get_vault(),
+                                             manifest_path=os.path.join(workdir, "manifest.db"), verbose=False)
+    return {"files": totals["files"], "seconds": totals["seconds"], "files_per_sec": totals["files_per_sec"],
+            "throttled_s": totals["throttled"], "errors": totals["errors"]}
+
+def stage_vault_query(args, queries):
+    from modules.vault_engine import load_synonym_index, query_vault, warm_wordnet
+    load_synonym_index()
+    warm_wordnet()
+    query_vault(queries[0])   # Warm Chroma's HNSW index and the query caches' code paths
+    return summarize(time_each(query_vault, queries))
+
+def stage_recall(args, queries):
+    from modules.ledger_mgr import get_ledger, initialize_ledger, recall_memory
+    initialize_ledger()
+    build_ledger(get_ledger(), args.summaries)
+    recall_memory(queries[0])
+    return summarize(time_each(recall_memory, queries))
+
+def stage_token_guard(args, orchestrator):
+    from modules.orchestrator import SessionState
+    state = SessionState()
+    for message in synthetic_history(12):
+        state.history.append(message)
+    state.t2_context = {"content": "Budget cap agreed.", "timestamp": 1.0, "entries": ["Budget cap agreed."] * 4}
+    samples = []
+    for i in range(args.queries):
+        started = time.perf_counter()
+        for message in synthetic_history(i + 1)[-2:]:
+            state.history.append(message)
+        orchestrator._elastic_guard(state)
+        orchestrator._pack(state, f"Question {i} about the budget")
+        samples.append(time.perf_counter() - started)
+        # Keep the history length steady so every sample measures the same work
+        state.history.drop_oldest(2)
+    return summarize(samples)
+
+async def stage_turn(args, orchestrator, queries, with_vault):
+    from modules.orchestrator import SessionState
+    state = SessionState()
+    await orchestrator.handle(state, f"/recall {queries[0]}")
+    if with_vault:
+        await orchestrator.handle(state, f"/vault {queries[0]}")
+    samples, ttft = [], []
+    for i in range(args.turns):
+        started = time.perf_counter()
+        result = await orchestrator.handle(state, f"What did we decide about {queries[i % len(queries)]}?")
+        samples.append(time.perf_counter() - started)
+        if result["stats"].get("ttft") is not None:
+            ttft.append(result["stats"]["ttft"])
+    return {**summarize(samples), "ttft": summarize(ttft)}
+
+def run_stage(results, name, fn, *fn_args):
+    print(f"[*] Benchmark stage: {name}", file=sys.stderr)
+    try:
+        results[name] = fn(*fn_args)
+    except ImportError as e:
+        results[name] = {"skipped": f"missing dependency: {e.name or e}"}
+    except LookupError as e:
+        # NLTK raises LookupError when a corpus (WordNet) isn't downloaded
+        results[name] = {"skipped": "missing data: " + " ".join(str(e).replace("*", "").split())[:120]}
+    return results[name]
+
+def run(args):
+    import ollama
+    from modules import inference, vault_engine
+    from modules.embedding_backends import backend_signature
+    from modules.ledger_mgr import close_ledger
+    from modules.orchestrator import NexusOrchestrator
+    from modules.summarizer import shutdown_scheduler
+
+    workdir = tempfile.mkdtemp(prefix="nexus_bench_suite_")
+    os.chdir(workdir)   # data/ (ledger, chroma, caches) is created here
+    server, url = start_fake_ollama(**latency_config(args))
+    inference.set_client(ollama.Client(host=url))
+    if not args.real_embed:
+        vault_engine._cpu_ef = HashEmbedding()
+
+    queries = make_queries(args.queries)
+    persona = "\n[SYSTEM OVERHEAD / TIER 0]\nUser: Sir\nAssistant: ALFRED\n\nRULES: Be concise.\n"
+    orchestrator = NexusOrchestrator(persona, prompt_mode="chat")
+    results = {}
+    try:
+        ingest = run_stage(results, "ingest", stage_ingest, args, workdir)
+        if "skipped" in ingest:
+            results["vault_query"] = {"skipped": "no ingested corpus"}
+        else:
+            run_stage(results, "vault_query", stage_vault_query, args, queries)
+        run_stage(results, "recall", stage_recall, args, queries)
+        run_stage(results, "token_guard", stage_token_guard, args, orchestrator)
+        with_vault = "skipped" not in results["vault_query"]
+        run_stage(results, "turn", lambda: asyncio.run(stage_turn(args, orchestrator, queries, with_vault)))
+    finally:
+        shutdown_scheduler()
+        close_ledger()
+        orchestrator.close()
+        server.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "embedding": backend_signature() if args.real_embed else "hash-64",
+            "fake_ollama": latency_config(args),
+            "sizes": {"files": args.files, "images": args.images, "summaries": args.summaries,
+                      "queries": args.queries, "turns": args.turns},
+        },
+        "results": results,
+    }
+
+def compare(current, baseline, tolerance):
+    """Lines describing every regression beyond tolerance (empty = none)."""
+    regressions = []
+    for name, stage in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "skipped" in stage or "skipped" in base:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if key in stage and base.get(key) and stage[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}.{key}: {base[key]:.2f} -> {stage[key]:.2f}")
+        if base.get("files_per_sec") and stage["files_per_sec"] < base["files_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}.files_per_sec: {base['files_per_sec']:.1f} -> {stage['files_per_sec']:.1f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--summaries", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--real-embed", action="store_true", help="Use NEXUS_EMBED_BACKEND instead of hashing")
+    parser.add_argument("--out", help="Also write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    add_latency_args(parser)
+    args = parser.parse_args()
+    if args.out:
+        args.out = os.path.abspath(args.out)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    # Module progress lines go to stderr; stdout carries only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"[!] Regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"[*] No regressions beyond {args.tolerance:.0%} against {args.compare}.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+A fake Ollama HTTP server for offline benchmarks (stdlib only, no model).
+
+Run from the repo root:  python -m benchmarks.fake_ollama [--port 11435] [--prompt-tps 400]
+                                                          [--token-rate 30] [--tokens 40]
+Then point Nexus at it:  OLLAMA_HOST=http://127.0.0.1:11435 python main.py
+
+Speaks the slice of the API Nexus uses (/api/generate, /api/chat, streamed or not,
+plus /api/tags, /api/ps and /api/version). Every model name is accepted and
+reported as loaded once used, so the model router's warm-up path is exercised. Latency is modelled like a single loaded model:
+a fixed overhead, prompt evaluation at --prompt-tps and generation at --token-rate,
+serialised by a semaphore of --parallel slots (OLLAMA_NUM_PARALLEL). Like Ollama's
+KV cache, only the part of a prompt after its common prefix with the previous
+prompt is evaluated, so chat-mode prefix stability shows up in the numbers. The
+prompt_eval_* / eval_* fields are filled in so TTFT and /stats look realistic.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = "Noted, Sir. The budget review stays on schedule and the vault figures agree.".split()
+
+def estimate_tokens(text):
+    return max(1, int(len(text.split()) * 1.3))
+
+class FakeOllamaConfig:
+    def __init__(self, overhead_ms=5, prompt_tps=400.0, token_rate=30.0, tokens=40, parallel=1):
+        self.overhead_s = overhead_ms / 1000
+        self.prompt_tps = prompt_tps
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.model = threading.Semaphore(parallel)
+        self.requests = 0
+        self.last_prompt = ""
+        self.loaded = {}      # model -> last used (for /api/ps)
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None   # Set per server by start_fake_ollama
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "fake:latest", "model": "fake:latest", "size": 0}]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [{"name": m, "model": m, "size": 0} for m in self.config.loaded]})
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/generate":
+            prompt = request.get("prompt", "")
+            piece_of = lambda text: {"response": text}
+        elif self.path == "/api/chat":
+            prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+            piece_of = lambda text: {"message": {"role": "assistant", "content": text}}
+        else:
+            self._send_json({"error": "not found"}, status=404)
+            return
+        self.config.requests += 1
+        self._reply(request, prompt, piece_of)
+
+    def _reply(self, request, prompt, piece_of):
+        cfg = self.config
+        model = request.get("model", "fake")
+        cfg.loaded[model] = time.time()
+        options = request.get("options") or {}
+        limit = options.get("num_predict") or cfg.tokens   # -1 means "until done"
+        n_tokens = cfg.tokens if limit < 0 else min(cfg.tokens, limit)
+        token_s = 1.0 / cfg.token_rate
+        stream = request.get("stream", True)
+
+        with cfg.model:
+            cached = len(os.path.commonprefix([cfg.last_prompt, prompt]))
+            cfg.last_prompt = prompt
+            prompt_tokens = estimate_tokens(prompt[cached:])
+            prompt_s = prompt_tokens / cfg.prompt_tps
+            started = time.perf_counter()
+            time.sleep(cfg.overhead_s + prompt_s)
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+            pieces = []
+            for i in range(n_tokens):
+                time.sleep(token_s)
+                piece = REPLY_WORDS[i % len(REPLY_WORDS)] + " "
+                pieces.append(piece)
+                if stream:
+                    self._chunk({"model": model, **piece_of(piece), "done": False})
+            final = {
+                "model": model, "done": True, "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - started) * 1e9),
+                "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(prompt_s * 1e9),
+                "eval_count": n_tokens, "eval_duration": int(n_tokens * token_s * 1e9),
+            }
+        if stream:
+            self._chunk({**final, **piece_of("")})
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json({**final, **piece_of("".join(pieces).strip())})
+
+    def _chunk(self, payload):
+        data = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+def start_fake_ollama(host="127.0.0.1", port=0, **config):
+    """Serves on a daemon thread. Returns (server, base_url); call server.shutdown() when done."""
+    handler = type("BoundFakeOllamaHandler", (FakeOllamaHandler,), {"config": FakeOllamaConfig(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def add_latency_args(parser):
+    parser.add_argument("--overhead-ms", type=float, default=5, help="Fixed cost per request")
+    parser.add_argument("--prompt-tps", type=float, default=400.0, help="Prompt-eval tokens/sec")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="Generated tokens/sec")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per reply")
+    parser.add_argument("--parallel", type=int, default=1, help="Concurrent generations")
+
+def latency_config(args):
+    return {"overhead_ms": args.overhead_ms, "prompt_tps": args.prompt_tps,
+            "token_rate": args.token_rate, "tokens": args.tokens, "parallel": args.parallel}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    add_latency_args(parser)
+    args = parser.parse_args()
+    server, url = start_fake_ollama(args.host, args.port, **latency_config(args))
+    print(f"[*] Fake Ollama listening on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
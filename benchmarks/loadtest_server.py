@@ -0,0 +1,169 @@
+"""
+Server-mode load test: N concurrent fake sessions against a stubbed Ollama.
+Needs aiohttp; no model, Chroma or network beyond localhost.
+
+Run from the repo root:  python -m benchmarks.loadtest_server [--sessions 16] [--turns 5]
+                                                              [--slots 1] [--token-ms 5] [--ws]
+
+The server runs in-process on an ephemeral port with a temporary ledger. The stub
+holds a semaphore for the length of each generation (like a single loaded model
+with OLLAMA_NUM_PARALLEL=slots), so the numbers show queueing and fairness in the
+FairLLMScheduler rather than model speed. Reports p50/p99 turn latency (and TTFT
+with --ws), rejected requests, and the spread of per-session mean latency.
+"""
+import os
+os.environ.setdefault("NEXUS_RESPONSE_CACHE", "0")   # Every turn must reach the stub
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import threading
+import time
+import aiohttp
+from aiohttp import web
+from modules import inference
+from modules.admission import FairLLMScheduler
+from modules.ledger_mgr import initialize_ledger
+from modules.orchestrator import NexusOrchestrator
+from modules.server import NexusServer
+
+class StubOllama:
+    """Speaks the slice of ollama's generate()/chat() API that Nexus uses."""
+
+    def __init__(self, parallel=1, prompt_ms=20, token_ms=5, tokens=40):
+        self.model = threading.Semaphore(parallel)
+        self.prompt_s = prompt_ms / 1000
+        self.token_s = token_ms / 1000
+        self.tokens = tokens
+
+    def generate(self, model, prompt, options=None, stream=False, keep_alive=None):
+        with self.model:
+            time.sleep(self.prompt_s + self.token_s * self.tokens)
+        return {"response": "Summary of the discussed budget items.", "done": True}
+
+    def chat(self, model, messages, options=None, keep_alive=None, stream=False):
+        def pieces():
+            with self.model:
+                time.sleep(self.prompt_s)
+                for i in range(self.tokens):
+                    time.sleep(self.token_s)
+                    yield {"message": {"content": f" tok{i}"}, "done": False}
+            yield {"message": {"content": ""}, "done": True,
+                   "prompt_eval_count": len(messages), "eval_count": self.tokens}
+        return pieces()
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def http_session(http, base, turns, record):
+    async with http.post(f"{base}/sessions") as r:
+        session_id = (await r.json())["session_id"]
+    for i in range(turns):
+        while True:
+            started = time.perf_counter()
+            async with http.post(f"{base}/sessions/{session_id}/messages",
+                                 json={"text": f"Question {i} about the budget"}) as r:
+                await r.read()
+                if r.status == 429:
+                    record["rejected"] += 1
+                    await asyncio.sleep(0.2)
+                    continue
+            record["latency"].append(time.perf_counter() - started)
+            break
+    async with http.delete(f"{base}/sessions/{session_id}") as r:
+        await r.read()
+
+async def ws_session(http, base, turns, record):
+    async with http.post(f"{base}/sessions") as r:
+        session_id = (await r.json())["session_id"]
+    async with http.ws_connect(f"{base}/sessions/{session_id}/ws") as ws:
+        for i in range(turns):
+            while True:
+                started, first = time.perf_counter(), None
+                await ws.send_str(f"Question {i} about the budget")
+                async for message in ws:
+                    data = message.json()
+                    if "token" in data and first is None:
+                        first = time.perf_counter() - started
+                    if "error" in data or data.get("done"):
+                        break
+                if "error" in data:
+                    record["rejected"] += 1
+                    await asyncio.sleep(0.2)
+                    continue
+                record["latency"].append(time.perf_counter() - started)
+                if first is not None:
+                    record["ttft"].append(first)
+                break
+        await ws.send_str("/exit")
+        await ws.receive()
+
+async def run(args):
+    inference.set_client(StubOllama(args.slots, args.prompt_ms, args.token_ms, args.tokens))
+    orchestrator = NexusOrchestrator("LOADTEST PERSONA", llm_scheduler=FairLLMScheduler(slots=args.slots),
+                                     speculate=False)
+    server = NexusServer(orchestrator, max_sessions=args.sessions)
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    records = [{"latency": [], "ttft": [], "rejected": 0} for _ in range(args.sessions)]
+    drive = ws_session if args.ws else http_session
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*[drive(http, base, args.turns, record) for record in records])
+        async with http.get(f"{base}/health") as r:
+            health = await r.json()
+    wall = time.perf_counter() - started
+    await runner.cleanup()
+
+    latency = [x for r in records for x in r["latency"]]
+    ttft = [x for r in records for x in r["ttft"]]
+    per_session = [statistics.mean(r["latency"]) for r in records if r["latency"]]
+    return {
+        "sessions": args.sessions, "turns": len(latency), "slots": args.slots, "wall_s": wall,
+        "throughput_turns_per_s": len(latency) / wall if wall else 0.0,
+        "latency_p50_ms": percentile(latency, 50) * 1000, "latency_p99_ms": percentile(latency, 99) * 1000,
+        "ttft_p50_ms": percentile(ttft, 50) * 1000, "ttft_p99_ms": percentile(ttft, 99) * 1000,
+        "rejected": sum(r["rejected"] for r in records),
+        "session_mean_spread_ms": (max(per_session) - min(per_session)) * 1000 if per_session else 0.0,
+        "llm": health["llm"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--slots", type=int, default=1, help="Concurrent generations (stub + scheduler)")
+    parser.add_argument("--prompt-ms", type=float, default=20)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--ws", action="store_true", help="Drive sessions over the WebSocket (adds TTFT)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="nexus_loadtest_"))   # Throwaway ledger under ./data
+    initialize_ledger()
+    result = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['sessions']} sessions x {args.turns} turns, {result['slots']} LLM slot(s): "
+          f"{result['turns']} turns in {result['wall_s']:.2f}s ({result['throughput_turns_per_s']:.1f}/s)")
+    print(f"  turn latency  p50 {result['latency_p50_ms']:8.1f} ms   p99 {result['latency_p99_ms']:8.1f} ms")
+    if args.ws:
+        print(f"  TTFT          p50 {result['ttft_p50_ms']:8.1f} ms   p99 {result['ttft_p99_ms']:8.1f} ms")
+    print(f"  rejected (429) {result['rejected']}, per-session mean spread {result['session_mean_spread_ms']:.1f} ms, "
+          f"max queue wait {result['llm']['max_wait'] * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Deterministic synthetic data for the offline benchmarks: a docs corpus (text plus
+rendered images for the OCR path), a Tier 2 ledger of N summaries spread over
+past days, queries and conversation history. Same seed, same data.
+"""
+import hashlib
+import os
+import random
+import time
+from modules.ledger_mgr import SQL_INSERT_SUMMARY, summary_row
+
+WORDS = ("budget project vault ledger tier memory nexus alfred cluster invoice schedule "
+         "deadline estimate revenue forecast sensor thermal model vector summary").split()
+
+class HashEmbedding:
+    """Deterministic 64-dim bag-of-hashes embedding; no model load, no torch."""
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            vec = [0.0] * 64
+            for word in text.split():
+                vec[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+            vectors.append(vec)
+        return vectors
+
+def build_corpus(target_dir, n_files, n_images, seed=7):
+    rng = random.Random(seed)
+    for i in range(n_files):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(80, 600))]
+        with open(os.path.join(target_dir, f"doc_{i:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Document {i}. " + " ".join(words))
+    if n_images:
+        from PIL import Image, ImageDraw
+        for i in range(n_images):
+            img = Image.new("RGB", (640, 120), "white")
+            ImageDraw.Draw(img).text((10, 40), f"Invoice {i} total budget {rng.randint(100, 9999)}", fill="black")
+            img.save(os.path.join(target_dir, f"scan_{i:05d}.png"))
+
+def build_ledger(ledger, n_summaries, days=60, session_id=None, seed=13):
+    """Inserts n_summaries Tier 2 rows with timestamps spread over the last `days` days."""
+    rng = random.Random(seed)
+    now = time.time()
+    rows = []
+    for i in range(n_summaries):
+        facts = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 40)))
+        content = f"Session note {i}: agreed {rng.choice(WORDS)} cap of {rng.randint(100, 9999)}. {facts}"
+        rows.append(summary_row(content, now - rng.uniform(0, days * 86400), session_id))
+    ledger.submit(lambda cursor: cursor.executemany(SQL_INSERT_SUMMARY, rows)).result()
+    return len(rows)
+
+def make_queries(n, seed=11):
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(WORDS, rng.randint(1, 3))) for _ in range(n)]
+
+def synthetic_history(n_turns):
+    history = []
+    for i in range(n_turns):
+        history.append(f"User: Question {i}: what did we decide about component {i} of the budget review?")
+        history.append(f"ALFRED: For component {i} we agreed to cap spend at {1000 + i * 37} and revisit next sprint.")
+    return history
@@ -1,31 +1,119 @@
 import sys
 import os
+import asyncio
 import threading
-from modules.inference import heartbeat_warmup, chat_inference
+from modules import startup_profile
+startup_profile.install() # No-op unless NEXUS_STARTUP_REPORT=1 / --timings
+from modules.inference import heartbeat_warmup, PROMPT_MODE
 from modules.identity import load_identity
-from modules.ledger_mgr import initialize_ledger, recall_memory, save_summary, consolidate_logs
-from modules.vault_engine import query_vault 
-from modules.tokenizer_tool import count_tokens 
-
-def prune_tier_1(history_list):
-    """
-    FR-07: Async Context Pruning logic.
-    Moves oldest 25% to Tier 2 via CPU-bound summarization.
-    """
-    slice_index = len(history_list) // 4
-    if slice_index == 0: slice_index = 1 
-    
-    to_summarize = list(history_list)[:slice_index]
-    
-    def background_task():
-        content = "\n".join(to_summarize)
-        # Summarizing for the Ledger (Tier 2)
-        summary = chat_inference("System", "Summarize these facts for Tier 2 storage.", content)
-        save_summary(summary) 
-        print(f"\n[*] FR-07: {len(to_summarize)} messages archived to Tier 2.")
+from modules.ledger_mgr import initialize_ledger, consolidate_logs, close_ledger
+from modules.vault_engine import preload_async
+from modules.summarizer import get_scheduler, shutdown_scheduler
+from modules.orchestrator import NexusOrchestrator, SessionState
+from modules.consolidator import start_background_consolidation
+from modules.tier2_vectors import start_summary_indexer, stop_summary_indexer
+from modules import telemetry
+startup_profile.mark("imports")
+
+# Load Chroma + the embedding model in the background once the prompt is up
+PRELOAD_VAULT = os.environ.get("NEXUS_PRELOAD_VAULT", "1") == "1"
+
+def ainput(prompt):
+    """input() on a daemon thread, so the event loop keeps prefetching while the user types."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return future
+
+def print_stats(stats):
+    if stats.get("cached"):
+        print(f"[*] Response cache hit ({stats['total'] * 1000:.0f} ms)")
+    elif stats.get("ttft") is not None:
+        print(f"[*] TTFT {stats['ttft']:.2f}s | {stats['tokens_per_sec']:.1f} tok/s | "
+              f"prompt eval {stats['prompt_eval_count']} tok in {stats['prompt_eval_ms']:.0f} ms")
+
+async def repl(orchestrator, state):
+    docs_watcher = None # Optional background Tier 3 sync (/watch)
 
-    threading.Thread(target=background_task, daemon=True).start()
-    return list(history_list)[slice_index:]
+    while True:
+        user_input = (await ainput("\nSir: ")).strip()
+        if not user_input: continue
+
+        # --- COMMAND INTERCEPTOR (process-wide commands; session commands go to the orchestrator) ---
+        if user_input.lower() in ["/exit", "/quit"]:
+            if state.history:
+                print("\nALFRED: 'One moment, Sir. Archiving session logs...'")
+            # FR-07: In-flight prune summaries must land before consolidation
+            await asyncio.to_thread(shutdown_scheduler)
+            if await orchestrator.end_session(state):
+                await asyncio.to_thread(consolidate_logs)
+            if docs_watcher:
+                docs_watcher.stop()
+            stop_summary_indexer()
+            close_ledger()
+            telemetry.flush()
+            print("ALFRED: 'System offline. Have a pleasant evening, Sir.'")
+            break
+
+        elif user_input.lower() == "/queue":
+            m = get_scheduler().metrics()
+            print(f"[*] Tier 2 Archiver: {m['depth']} queued, {m['in_flight']} in flight, "
+                  f"{m['batches']} batches ({m['coalesced']} slices coalesced), {m['failed']} failed")
+            print(f"[*] Latency: last {m['last_latency']:.1f}s | avg {m['avg_latency']:.1f}s | "
+                  f"max {m['max_latency']:.1f}s | oldest waiting {m['oldest_wait']:.1f}s")
+            if m['behind']:
+                print("[!] Archiving is falling behind the conversation.")
+            continue
+
+        elif user_input.lower() == "/stats":
+            telemetry.print_stage_stats()
+            continue
+
+        elif user_input.lower() == "/ingest":
+            from modules.ingest_handler import sync_docs_folder
+            await asyncio.to_thread(sync_docs_folder)
+            continue
+
+        elif user_input.lower() == "/watch":
+            if docs_watcher:
+                docs_watcher.stop()
+                docs_watcher = None
+                print("[*] Docs watch mode disabled.")
+            else:
+                from modules.ingest_handler import DocsWatcher
+                docs_watcher = DocsWatcher().start()
+                print("[*] Docs watch mode enabled. Tier 3 will follow data/docs automatically.")
+            continue
+
+        # --- NEXUS LOOP: tokens are printed as they arrive ---
+        started = False
+        def on_token(piece):
+            nonlocal started
+            if not started:
+                started = True
+                print("\nALFRED: ", end="")
+            print(piece, end="", flush=True)
+
+        result = await orchestrator.handle(state, user_input, on_token=on_token)
+        if started:
+            print()
+        for notice in result["notices"]:
+            print(notice)
+        if result["type"] == "reply":
+            print_stats(result["stats"])
 
 def start_system():
     print("--- NEXUS CORE: PHASE 4 (DYNAMIC CONTEXT & ORCHESTRATION) ---")
@@ -33,120 +121,35 @@ def start_system():
     if not heartbeat_warmup():
         print("[!] Failed to warm up inference engine.")
         return
+    startup_profile.mark("heartbeat warm-up")
 
-    persona, persona_tokens = load_identity()
+    # Chat mode keeps the persona byte-stable; the time travels with the volatile context
+    persona, persona_tokens = load_identity(include_time=(PROMPT_MODE != "chat"))
+    startup_profile.mark("identity")
     initialize_ledger()
+    start_background_consolidation() # FR-04: Roll closed days/weeks/months into digests
+    startup_profile.mark("ledger")
 
-    # FR-14: Define the Elastic Parameters
-    BASE_T1_LIMIT = 2048
-    CONTEXT_RESERVE = 800
-    
-    rolling_history = [] 
-    
-    # State management for FR-16 Orchestration
-    t2_context = None # Stores {content, timestamp, source}
-    t3_context = None # Stores {content, timestamp, source}
+    orchestrator = NexusOrchestrator(persona)
+    state = SessionState()
 
     print(f"Nexus Core: Identity, Ledger, & Vault Layers initialized.") 
-
-    while True:
-        try:
-            # --- STEP 4.2: DYNAMIC BUDGET CALCULATION (FR-14) ---
-            has_active_context = t2_context or t3_context
-            current_t1_threshold = BASE_T1_LIMIT + (0 if has_active_context else CONTEXT_RESERVE)
-            
-            user_input = input("\nSir: ").strip()
-            if not user_input: continue
-            
-            # --- COMMAND INTERCEPTOR ---
-            if user_input.lower() in ["/exit", "/quit"]:
-                if rolling_history:
-                    print("\nALFRED: 'One moment, Sir. Archiving session logs...'")
-                    full_history_str = "\n".join(rolling_history)
-                    reflection_prompt = "Summarize the key technical facts and preferences from this session."
-                    summary_text = chat_inference(persona, "", f"History:\n{full_history_str}\n\nTask: {reflection_prompt}")
-                    save_summary(summary_text)
-                    consolidate_logs()
-                print("ALFRED: 'System offline. Have a pleasant evening, Sir.'")
-                break
-
-            elif user_input.lower() == "/clear":
-                t2_context = None
-                t3_context = None
-                print(f"[*] Context cleared. Tier 1 budget expanded.")
-                continue
-
-            elif user_input.startswith("/recall"):
-                query = user_input.replace("/recall", "").strip()
-                t2_context = recall_memory(query)
-                if t2_context:
-                    # Note: t2_context['timestamp'] is now a float
-                    print(f"[*] Tier 2 Context Injected.")
-                continue
-
-            elif user_input.startswith("/vault"):
-                query = user_input.replace("/vault", "").strip()
-                print("[*] Performing CPU-Bound Semantic Search...")
-                t3_context = query_vault(query) 
-                
-                if t3_context and "No relevant info found" not in str(t3_context):
-                    print(f"[*] Tier 3 Context Injected.")
-                else:
-                    print(f"ALFRED: No relevant vault data found.")
-                    t3_context = None
-                continue
-
-            elif user_input.lower() == "/ingest":
-                from modules.ingest_handler import sync_docs_folder
-                sync_docs_folder()
-                continue
-            
-            # --- STEP 4.1 & 4.2: THE ELASTIC GUARD ---
-            if count_tokens("\n".join(rolling_history)) > current_t1_threshold:
-                print(f"[*] Elasticity Triggered: Shrinking history to accommodate context...")
-                rolling_history = prune_tier_1(rolling_history)
-
-            # --- STEP 4.3: CONFLICT ORCHESTRATOR (FR-16) ---
-            warning_block = ""
-            injected_str = "No external documents loaded."
-            
-            if t2_context and t3_context:
-                # UPDATED: Now both are floats, so this is a clean numerical comparison
-                if t3_context['timestamp'] > t2_context['timestamp']:
-                    warning_block = "\n[!] SYSTEM: Vault data is more recent. Prioritizing Tier 3.\n"
-                else:
-                    warning_block = "\n[!] SYSTEM: Session logs are more recent. Prioritizing Tier 2.\n"
-
-                # Debug Print (Optional):
-                # print(f"DEBUG: T2 TS: {t2_context['timestamp']} | T3 TS: {t3_context['timestamp']}")
-
-            if has_active_context:
-                content_2 = t2_context['content'] if t2_context else "None"
-                content_3 = t3_context['content'] if t3_context else "None"
-                injected_str = f"{warning_block}\n[TIER 2]: {content_2}\n\n[TIER 3]: {content_3}"
-
-            # --- NEXUS LOOP: INFERENCE ---
-            history_str = "\n".join(rolling_history)
-            
-            prompt_context = f"""
-{injected_str}
-
-### INSTRUCTIONS ###
-You are ALFRED. Use the [TIER 3] or [TIER 2] data above as your absolute source of truth. 
-If data conflicts, prioritize the entry specifically flagged in the SYSTEM warning.
-
-### HISTORY ###
-{history_str}
-"""
-            response = chat_inference(persona, prompt_context, user_input)
-            
-            rolling_history.append(f"User: {user_input}")
-            rolling_history.append(f"ALFRED: {response}")
-
-            print(f"\nALFRED: {response}")
-
-        except KeyboardInterrupt:
-            sys.exit()
+    startup_profile.mark("first prompt")
+    startup_profile.report()
+    if PRELOAD_VAULT:
+        preload_async() # Runs while the user types the first message
+        start_summary_indexer() # Tier 2 semantic recall; shares the preloaded embedding model
+
+    try:
+        asyncio.run(repl(orchestrator, state))
+    except KeyboardInterrupt:
+        sys.exit()
+    orchestrator.close()
 
 if __name__ == "__main__":
-    start_system()
\ No newline at end of file
+    if "--serve" in sys.argv:
+        # Multi-session HTTP/WebSocket mode (see modules/server.py)
+        from modules.server import run_server
+        run_server()
+    else:
+        start_system()
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+# One local model: generations beyond this only queue inside Ollama (see OLLAMA_NUM_PARALLEL)
+LLM_SLOTS = int(os.environ.get("NEXUS_LLM_SLOTS", "1"))
+MAX_WAITING = int(os.environ.get("NEXUS_MAX_WAITING", "32"))     # Global queue bound (beyond it: reject)
+MAX_WAITING_PER_SESSION = 2                                       # One client cannot fill the queue
+
+class AdmissionError(RuntimeError):
+    """Raised when the LLM queue is full; servers map it to 429 / retry later."""
+
+class FairLLMScheduler:
+    """
+    Admission control + round-robin scheduling of LLM calls across sessions.
+    Each session has its own FIFO of waiters; a freed slot goes to the next session
+    in rotation, so one chatty session cannot starve the others. Requests beyond
+    MAX_WAITING (or MAX_WAITING_PER_SESSION) are rejected instead of queued.
+    Lives on one event loop (the server's); blocking calls run inside the slot.
+    """
+
+    def __init__(self, slots=LLM_SLOTS, max_waiting=MAX_WAITING, per_session=MAX_WAITING_PER_SESSION):
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.per_session = per_session
+        self._free = slots
+        self._waiters = OrderedDict()   # session_id -> deque of futures, in rotation order
+        self._waiting = 0
+        self._stats = {"admitted": 0, "rejected": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    @asynccontextmanager
+    async def slot(self, session_id, admit=True):
+        """
+        async with scheduler.slot(sid): holds one LLM slot for the block.
+        admit=False skips the queue bounds (session archiving must not be refused).
+        """
+        started = time.perf_counter()
+        if self._free > 0 and not self._waiting:
+            self._free -= 1
+        else:
+            queued = self._waiters.get(session_id)
+            if admit and (self._waiting >= self.max_waiting or (queued and len(queued) >= self.per_session)):
+                self._stats["rejected"] += 1
+                raise AdmissionError("LLM queue is full, try again shortly.")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(session_id, deque()).append(waiter)
+            self._waiting += 1
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()       # Slot was handed over just as we were cancelled
+                else:
+                    self._forget(session_id, waiter)
+                raise
+
+        waited = time.perf_counter() - started
+        self._stats["admitted"] += 1
+        self._stats["total_wait"] += waited
+        self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _forget(self, session_id, waiter):
+        queued = self._waiters.get(session_id)
+        if queued and waiter in queued:
+            queued.remove(waiter)
+            self._waiting -= 1
+            if not queued:
+                del self._waiters[session_id]
+
+    def _release(self):
+        """Hands the slot to the head of the next session in rotation, or frees it."""
+        while self._waiters:
+            session_id, queued = next(iter(self._waiters.items()))
+            waiter = queued.popleft()
+            self._waiting -= 1
+            if queued:
+                self._waiters.move_to_end(session_id)
+            else:
+                del self._waiters[session_id]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._free += 1
+
+    def metrics(self):
+        admitted = self._stats["admitted"]
+        return {
+            "slots": self.slots,
+            "busy": self.slots - self._free,
+            "waiting": self._waiting,
+            "waiting_sessions": len(self._waiters),
+            "admitted": admitted,
+            "rejected": self._stats["rejected"],
+            "avg_wait": self._stats["total_wait"] / admitted if admitted else 0.0,
+            "max_wait": self._stats["max_wait"],
+        }
@@ -0,0 +1,99 @@
+from modules.tokenizer_tool import get_encoding, count_tokens
+
+# Tier 3 chunking: small enough for a focused embedding, overlapped so facts
+# that straddle a boundary survive in at least one chunk.
+CHUNK_TOKENS = 256
+CHUNK_OVERLAP = 48
+
+def _decode(encoding, tokens):
+    # Slicing can cut a multi-byte character in half; drop the partial bytes
+    return encoding.decode_bytes(tokens).decode("utf-8", errors="ignore")
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Splits text into token windows of max_tokens with `overlap` tokens shared
+    between neighbours. Returns [{text, chunk_index, token_start, token_end}].
+    """
+    encoding = get_encoding()
+    tokens = encoding.encode(text)
+    if not tokens:
+        return []
+
+    step = max(1, max_tokens - overlap)
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + max_tokens, len(tokens))
+        chunks.append({
+            "text": _decode(encoding, tokens[start:end]),
+            "chunk_index": len(chunks),
+            "token_start": start,
+            "token_end": end,
+        })
+        if end >= len(tokens):
+            break
+        start += step
+    return chunks
+
+def chunk_metadata(meta):
+    """Normalises chunk metadata; whole-file legacy entries count as a single chunk 0."""
+    start = int(meta.get("token_start", 0))
+    return {
+        "parent": meta.get("parent_hash") or meta.get("hash"),
+        "index": int(meta.get("chunk_index", 0)),
+        "start": start,
+        "end": int(meta.get("token_end", start)),
+    }
+
+def merge_chunks(hits, token_budget):
+    """
+    Turns ranked vault hits [(text, meta, distance)] into prompt passages.
+    Hits from the same file with consecutive chunk indexes are stitched together
+    (dropping their overlap), and passages are taken best-first until token_budget.
+    Returns [{text, meta, distance, tokens}] in rank order.
+    """
+    encoding = get_encoding()
+
+    # 1. Group by parent file, remembering each file's best rank
+    groups = {}
+    for rank, (text, meta, distance) in enumerate(hits):
+        info = chunk_metadata(meta)
+        group = groups.setdefault(info["parent"], {"rank": rank, "chunks": {}})
+        group["chunks"].setdefault(info["index"], (text, meta, distance, info))
+
+    # 2. Stitch consecutive chunks into runs
+    passages = []
+    for group in sorted(groups.values(), key=lambda g: g["rank"]):
+        run = None
+        for index in sorted(group["chunks"]):
+            text, meta, distance, info = group["chunks"][index]
+            if run is not None and index == run["last_index"] + 1:
+                overlap = max(0, run["end"] - info["start"])
+                run["text"] += _decode(encoding, encoding.encode(text)[overlap:])
+                run["end"] = info["end"]
+                run["last_index"] = index
+                run["distance"] = min(run["distance"], distance)
+                continue
+            if run is not None:
+                passages.append(run)
+            run = {"text": text, "meta": meta, "distance": distance,
+                   "end": info["end"], "last_index": index, "rank": group["rank"]}
+        passages.append(run)
+
+    # 3. Fill the budget best-first
+    passages.sort(key=lambda p: (p["rank"], p["distance"]))
+    selected = []
+    used = 0
+    for passage in passages:
+        tokens = count_tokens(passage["text"])
+        if used + tokens > token_budget:
+            remaining = token_budget - used
+            if selected or remaining <= 0:
+                continue
+            # Nothing fits yet (e.g. a legacy whole-file entry): keep its head
+            passage["text"] = _decode(encoding, encoding.encode(passage["text"])[:remaining])
+            tokens = remaining
+        selected.append({"text": passage["text"], "meta": passage["meta"],
+                         "distance": passage["distance"], "tokens": tokens})
+        used += tokens
+    return selected
@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from modules.inference import chat_inference, wait_for_foreground_idle
+from modules.ledger_mgr import DIGEST_LEVELS, get_ledger
+
+# FR-04: Hierarchical consolidation
+MAX_DIGEST_INPUTS = 24        # Sources per LLM call; bigger periods are digested in stages
+
+_consolidation_lock = threading.Lock()   # One pass at a time (startup thread vs. /exit)
+_background_thread = None
+
+def period_bounds(timestamp, level):
+    """Local-time [start, end) of the day / ISO week / month containing timestamp."""
+    day = datetime.fromtimestamp(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    if level == 1:
+        start, end = day, day + timedelta(days=1)
+    elif level == 2:
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+    else:
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    return start.timestamp(), end.timestamp()
+
+def digest_texts(texts, level):
+    """Asks the model to merge Tier 2 entries into one digest for the period."""
+    content = "\n\n".join(texts)
+    return chat_inference(
+        "System",
+        f"Merge these Tier 2 notes into one {DIGEST_LEVELS[level]} digest. "
+        "Keep every concrete fact, decision, number and stated preference; drop repetition.",
+        content,
+        use_cache=False,
+        role="summarize"
+    )
+
+def _digest(texts, level, digest_fn):
+    if len(texts) == 1:
+        return texts[0]  # A lone leftover of a staged merge: nothing to merge
+    if len(texts) > MAX_DIGEST_INPUTS:
+        texts = [_digest(texts[i:i + MAX_DIGEST_INPUTS], level, digest_fn)
+                 for i in range(0, len(texts), MAX_DIGEST_INPUTS)]
+        return _digest(texts, level, digest_fn)
+    # Interactive generation owns the model; digest in the gaps
+    wait_for_foreground_idle()
+    return digest_fn(texts, level)
+
+def consolidate(ledger=None, session_id=None, now=None, digest_fn=digest_texts):
+    """
+    FR-04: Rolls every *completed* period of one scope up one level at a time:
+    summaries -> daily digests -> weekly digests -> monthly digests.
+    Sources are archived and linked to their digest (summary_provenance), so recall
+    can still drill down to them. A period with a single row promotes that row in
+    place rather than storing its text again. Returns {level name: digests written}.
+    """
+    ledger = ledger or get_ledger()
+    now = time.time() if now is None else now
+    written = {}
+    promoted = 0
+    with _consolidation_lock:
+        for level in sorted(DIGEST_LEVELS):
+            groups = {}
+            for row_id, timestamp, content in ledger.consolidation_candidates(level - 1, session_id, now):
+                bounds = period_bounds(timestamp, level)
+                if bounds[1] <= now:  # Only closed periods; the current one may still grow
+                    groups.setdefault(bounds, []).append((row_id, content))
+            for (start, end), members in sorted(groups.items()):
+                if len(members) == 1:
+                    # Nothing to merge: the row itself carries up a level, no copy of its text
+                    ledger.promote(members[0][0], level, start, end)
+                    promoted += 1
+                    continue
+                content = _digest([c for _, c in members], level, digest_fn)
+                ledger.save_digest(content, level, start, end, [row_id for row_id, _ in members], session_id)
+                written[DIGEST_LEVELS[level]] = written.get(DIGEST_LEVELS[level], 0) + 1
+    if written or promoted:
+        # Archived sources leave the vector index, promoted rows get their new level
+        from modules.tier2_vectors import notify_summary_index
+        notify_summary_index()
+    if written:
+        print(f"\n[*] Tier 2 Consolidation: {', '.join(f'{n} {name}' for name, n in written.items())} digest(s) written.")
+    return written
+
+def start_background_consolidation(ledger=None):
+    """Catches up every scope's closed periods on a daemon thread (e.g. at startup)."""
+    global _background_thread
+    if _background_thread is not None and _background_thread.is_alive():
+        return _background_thread
+
+    def run():
+        target = ledger or get_ledger()
+        try:
+            for session_id in target.active_scopes():
+                consolidate(target, session_id)
+        except Exception as e:
+            print(f"\n[!] Tier 2 Consolidation failed: {e}")
+
+    _background_thread = threading.Thread(target=run, name="tier2-consolidation", daemon=True)
+    _background_thread.start()
+    return _background_thread
@@ -0,0 +1,73 @@
+import os
+from functools import lru_cache
+from modules.inference import CONTEXT_WINDOW
+from modules.tokenizer_tool import count_tokens
+
+# One budget for everything the model reads per turn (persona, Tier 2/3 data, history, input).
+# Prompt size drives Ollama's prompt-eval time, so this is the knob for predictable latency.
+# It never exceeds the model's num_ctx minus room for the reply (and tokenizer drift).
+REPLY_RESERVE = 2048
+MAX_PROMPT_TOKENS = CONTEXT_WINDOW - REPLY_RESERVE
+PROMPT_TOKEN_BUDGET = min(int(os.environ.get("NEXUS_PROMPT_BUDGET", MAX_PROMPT_TOKENS)), MAX_PROMPT_TOKENS)
+
+# Base priorities; each candidate loses one point per rank within its kind, so the
+# newest turns and the best-ranked Tier 2/3 entries are kept first.
+PRIORITY_HISTORY = 90
+PRIORITY_T3 = 70
+PRIORITY_T2 = 65
+
+@lru_cache(maxsize=8192)
+def token_cost(text):
+    """count_tokens, memoised: the same persona / entry / turn is only encoded once."""
+    return count_tokens(text)
+
+class Segment:
+    """One packable piece of prompt. `chain` segments are taken in priority order without gaps."""
+
+    __slots__ = ("kind", "text", "priority", "tokens", "required", "chain", "position")
+
+    def __init__(self, kind, text, priority=0, tokens=None, required=False, chain=None, position=0):
+        self.kind = kind
+        self.text = text
+        self.priority = priority
+        self.tokens = token_cost(text) if tokens is None else tokens
+        self.required = required
+        self.chain = chain
+        self.position = position
+
+def pack_segments(segments, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Fills `budget` in one pass: required segments first, then the rest by priority,
+    skipping whatever does not fit (a skipped chain member ends its chain, so history
+    never gets holes). Returns {kept: {kind: [text in position order]}, dropped, used, budget}.
+    """
+    used = sum(s.tokens for s in segments if s.required)
+    taken = [s for s in segments if s.required]
+    dropped = []
+    broken = set()
+    for seg in sorted((s for s in segments if not s.required), key=lambda s: (-s.priority, s.position)):
+        if seg.chain is not None and seg.chain in broken:
+            dropped.append(seg)
+        elif used + seg.tokens <= budget:
+            taken.append(seg)
+            used += seg.tokens
+        else:
+            dropped.append(seg)
+            if seg.chain is not None:
+                broken.add(seg.chain)
+
+    kept = {}
+    for seg in sorted(taken, key=lambda s: s.position):
+        kept.setdefault(seg.kind, []).append(seg.text)
+    return {"kept": kept, "dropped": dropped, "used": used, "budget": budget}
+
+def dropped_report(packed):
+    """'[*] Context packer: dropped ...' line, or None when everything fit."""
+    if not packed["dropped"]:
+        return None
+    by_kind = {}
+    for seg in packed["dropped"]:
+        count, tokens = by_kind.get(seg.kind, (0, 0))
+        by_kind[seg.kind] = (count + 1, tokens + seg.tokens)
+    parts = ", ".join(f"{count} {kind} ({tokens} tok)" for kind, (count, tokens) in by_kind.items())
+    return f"[*] Context packer: dropped {parts}; prompt {packed['used']}/{packed['budget']} tok."
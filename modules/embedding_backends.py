@@ -0,0 +1,80 @@
+import os
+import time
+
+# Tier 3 embedding backends. Everything stays on the CPU (Llama owns the VRAM):
+#   torch      - the original fp32 SentenceTransformer via Chroma's embedding function
+#   onnx       - the same model exported to ONNX Runtime (fp32 graph)
+#   onnx-int8  - dynamically int8-quantized ONNX graph shipped with the model
+# Optional Matryoshka truncation (NEXUS_EMBED_DIM) and sign binarisation (NEXUS_EMBED_BINARY=1)
+# apply on top of any backend.
+EMBEDDING_MODEL = "mixedbread-ai/mxbai-embed-large-v1"
+EMBEDDING_BACKEND = os.environ.get("NEXUS_EMBED_BACKEND", "torch")
+EMBEDDING_DIM = int(os.environ.get("NEXUS_EMBED_DIM", "0")) or None
+EMBEDDING_BINARY = os.environ.get("NEXUS_EMBED_BINARY") == "1"
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quantized.onnx",
+}
+
+def backend_signature(backend=EMBEDDING_BACKEND, dim=EMBEDDING_DIM, binary=EMBEDDING_BINARY):
+    """
+    Names the vector space a configuration produces, e.g. 'torch' or 'onnx-int8-d512-bin'.
+    Vectors from different signatures are not comparable, so each gets its own
+    collection and ingest manifest ('torch' keeps the original names).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r} (expected one of {', '.join(BACKENDS)}).")
+    signature = backend
+    if dim:
+        signature += f"-d{dim}"
+    if binary:
+        signature += "-bin"
+    return signature
+
+def binarize(vector):
+    """Sign quantisation: cosine between ±1 vectors is 1 - 2 * hamming / dims."""
+    return [1.0 if x > 0 else -1.0 for x in vector]
+
+class SentenceEmbedder:
+    """
+    Chroma-compatible embedding function over a SentenceTransformer with a
+    configurable runtime. Returns plain lists, like Chroma's own wrapper.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, dim=EMBEDDING_DIM,
+                 binary=EMBEDDING_BINARY):
+        from sentence_transformers import SentenceTransformer
+
+        kwargs = {"device": "cpu", "truncate_dim": dim}
+        if backend in ONNX_FILES:
+            # Needs sentence-transformers >= 3.2 with the onnx extra (onnxruntime + optimum)
+            kwargs["backend"] = "onnx"
+            kwargs["model_kwargs"] = {"file_name": ONNX_FILES[backend], "provider": "CPUExecutionProvider"}
+        self.model = SentenceTransformer(model_name, **kwargs)
+        self.binary = binary
+        self.signature = backend_signature(backend, dim, binary)
+
+    def __call__(self, input):
+        vectors = self.model.encode(list(input), convert_to_numpy=True, normalize_embeddings=False)
+        if self.binary:
+            return [binarize(v) for v in vectors]
+        return [v.tolist() for v in vectors]
+
+def load_embedding_function(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, dim=EMBEDDING_DIM,
+                            binary=EMBEDDING_BINARY):
+    """Builds the configured CPU embedding function. The default is the original Chroma wrapper."""
+    started = time.perf_counter()
+    signature = backend_signature(backend, dim, binary)
+    if signature == "torch":
+        # Unchanged default: existing collections were created with this exact function
+        from chromadb.utils import embedding_functions
+        ef = embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=model_name,
+            device="cpu"
+        )
+    else:
+        ef = SentenceEmbedder(model_name, backend, dim, binary)
+    print(f"\n[*] Tier 3 embedding model ({signature}) loaded in {time.perf_counter() - started:.1f}s.")
+    return ef
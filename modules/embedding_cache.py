@@ -0,0 +1,246 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Persistent Tier 3 embedding store: identical text is never embedded twice per model.
+# Vectors live in one float16 memory-mapped matrix per model; SQLite maps
+# (model id, sha256 of the text) to a row of that matrix.
+EMBEDDING_CACHE = os.environ.get("NEXUS_EMBED_CACHE", "1") == "1"
+CACHE_DIR = os.path.join("data", "embedding_cache")
+CACHE_MAX_MB = int(os.environ.get("NEXUS_EMBED_CACHE_MB", "1024"))   # Per model; LRU rows are recycled beyond it
+INITIAL_CAPACITY = 1024       # Rows; the matrix file doubles when full
+SQL_BATCH = 500               # Hashes per IN (...) lookup
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+class EmbeddingCache:
+    """
+    (model id, text hash) -> float16 vector, memory-mapped so a warm store costs page
+    reads instead of model forward passes. Rows beyond the size bound are evicted
+    least-recently-used first and their slots reused.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._matrices = {}   # model -> np.memmap
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_models (
+                model TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                next_slot INTEGER NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(model, last_used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS free_slots (model TEXT NOT NULL, slot INTEGER NOT NULL)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    # --- MATRIX FILES ---
+
+    def _model_row(self, model):
+        return self.conn.execute(
+            "SELECT file, dim, capacity, next_slot FROM embedding_models WHERE model = ?", (model,)
+        ).fetchone()
+
+    def _matrix(self, model, row):
+        file_name, dim, capacity, _ = row
+        matrix = self._matrices.get(model)
+        if matrix is None or matrix.shape[0] != capacity:
+            matrix = np.memmap(os.path.join(self.cache_dir, file_name), dtype=np.float16,
+                               mode="r+", shape=(capacity, dim))
+            self._matrices[model] = matrix
+        return matrix
+
+    def _register(self, model, dim):
+        file_name = hashlib.sha1(model.encode()).hexdigest()[:16] + ".f16"
+        with open(os.path.join(self.cache_dir, file_name), "wb") as f:
+            f.truncate(INITIAL_CAPACITY * dim * 2)
+        self.conn.execute(
+            "INSERT INTO embedding_models (model, file, dim, capacity, next_slot) VALUES (?, ?, ?, ?, 0)",
+            (model, file_name, dim, INITIAL_CAPACITY)
+        )
+        return self._model_row(model)
+
+    def _grow(self, model, row, needed):
+        file_name, dim, capacity, next_slot = row
+        while capacity < needed:
+            capacity *= 2
+        matrix = self._matrices.pop(model, None)
+        if matrix is not None:
+            matrix.flush()
+            del matrix
+        with open(os.path.join(self.cache_dir, file_name), "r+b") as f:
+            f.truncate(capacity * dim * 2)
+        self.conn.execute("UPDATE embedding_models SET capacity = ? WHERE model = ?", (capacity, model))
+        return (file_name, dim, capacity, next_slot)
+
+    def _allocate(self, model, row, count):
+        """Reuses evicted slots first, then appends (growing the file)."""
+        free = self.conn.execute(
+            "SELECT rowid, slot FROM free_slots WHERE model = ? LIMIT ?", (model, count)
+        ).fetchall()
+        if free:
+            self.conn.executemany("DELETE FROM free_slots WHERE rowid = ?", [(rowid,) for rowid, _ in free])
+        slots = [slot for _, slot in free]
+        fresh = count - len(slots)
+        if fresh:
+            file_name, dim, capacity, next_slot = row
+            if next_slot + fresh > capacity:
+                row = self._grow(model, row, next_slot + fresh)
+            slots.extend(range(next_slot, next_slot + fresh))
+            self.conn.execute("UPDATE embedding_models SET next_slot = ? WHERE model = ?", (next_slot + fresh, model))
+            row = (row[0], row[1], row[2], next_slot + fresh)
+        return slots, row
+
+    # --- LOOKUP / STORE ---
+
+    def get_many(self, model, hashes):
+        """Returns {hash: float32 vector} for every hash already stored."""
+        found = {}
+        with self._lock:
+            row = self._model_row(model)
+            if row is None:
+                self.misses += len(hashes)
+                return found
+            matrix = self._matrix(model, row)
+            unique = list(dict.fromkeys(hashes))
+            now = time.time()
+            for i in range(0, len(unique), SQL_BATCH):
+                batch = unique[i:i + SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, slot FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    (model, *batch)
+                ).fetchall()
+                for h, slot in rows:
+                    found[h] = np.asarray(matrix[slot], dtype=np.float32)
+                if rows:
+                    self.conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({marks})",
+                        (now, model, *batch)
+                    )
+            self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        """Stores [(hash, vector)]. Vectors are written (and flushed) before the index commits."""
+        if not items:
+            return
+        with self._lock:
+            dim = len(items[0][1])
+            row = self._model_row(model) or self._register(model, dim)
+            fresh = [(h, v) for h, v in dict(items).items()
+                     if self.conn.execute("SELECT 1 FROM embeddings WHERE model = ? AND text_hash = ?",
+                                          (model, h)).fetchone() is None]
+            if not fresh:
+                return
+            slots, row = self._allocate(model, row, len(fresh))
+            matrix = self._matrix(model, row)
+            for slot, (_, vector) in zip(slots, fresh):
+                matrix[slot] = np.asarray(vector, dtype=np.float16)
+            matrix.flush()
+            now = time.time()
+            self.conn.executemany(
+                "INSERT INTO embeddings (model, text_hash, slot, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, slot, now) for slot, (h, _) in zip(slots, fresh)]
+            )
+            self._evict(model, row[1])
+            self.conn.commit()
+
+    def _evict(self, model, dim):
+        max_rows = max(1, self.max_bytes // (dim * 2))
+        stored = self.conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
+        if stored <= max_rows:
+            return
+        # Drop to 90% so eviction isn't paid on every insert
+        doomed = self.conn.execute(
+            "SELECT text_hash, slot FROM embeddings WHERE model = ? ORDER BY last_used LIMIT ?",
+            (model, stored - int(max_rows * 0.9))
+        ).fetchall()
+        self.conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?",
+                              [(model, h) for h, _ in doomed])
+        self.conn.executemany("INSERT INTO free_slots (model, slot) VALUES (?, ?)",
+                              [(model, slot) for _, slot in doomed])
+
+    def stats(self):
+        with self._lock:
+            rows = self.conn.execute('''
+                SELECT m.model, m.dim, m.capacity, COUNT(e.text_hash) FROM embedding_models AS m
+                LEFT JOIN embeddings AS e ON e.model = m.model GROUP BY m.model
+            ''').fetchall()
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "models": {model: {"entries": n, "dim": dim, "file_mb": capacity * dim * 2 / 1048576}
+                       for model, dim, capacity, n in rows},
+        }
+
+    def close(self):
+        with self._lock:
+            for matrix in self._matrices.values():
+                matrix.flush()
+            self._matrices.clear()
+            self.conn.close()
+
+class CachedEmbeddingFunction:
+    """
+    Wraps a Chroma embedding function: texts already in the store are read back,
+    only the rest go through the model (in one batch). Hits and misses both return
+    the float16-rounded vector, so the same text always embeds identically.
+    """
+
+    def __init__(self, ef, model_id, cache=None):
+        self.ef = ef
+        self.model_id = model_id
+        self.cache = cache or get_embedding_cache()
+
+    def __call__(self, input):
+        texts = list(input)
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model_id, hashes)
+        missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+        if missing:
+            vectors = self.ef(list(missing.values()))
+            computed = [(h, np.asarray(v, dtype=np.float16)) for h, v in zip(missing, vectors)]
+            self.cache.put_many(self.model_id, computed)
+            found.update((h, v.astype(np.float32)) for h, v in computed)
+        return [found[h].tolist() for h in hashes]
+
+    def __getattr__(self, name):
+        # Chroma may ask the wrapped function for name()/get_config()/etc.
+        return getattr(self.ef, name)
+
+# --- MODULE-LEVEL STORE ---
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
@@ -0,0 +1,112 @@
+from collections import deque
+from modules.tokenizer_tool import count_tokens
+
+class Turn:
+    """
+    Bookkeeping for one Tier 1 line ('User: ...' / 'ALFRED: ...'), tokenized once.
+    The text itself lives only in the history's rendered buffer.
+    """
+
+    __slots__ = ("tokens", "start", "length", "role", "skip")
+
+    def __init__(self, text, start):
+        self.tokens = count_tokens(text)
+        self.start = start     # Absolute offset of text in the session's rendered buffer
+        self.length = len(text)
+        if text.startswith("ALFRED: "):
+            self.role, self.skip = "assistant", len("ALFRED: ")
+        else:
+            self.role, self.skip = "user", len("User: ") if text.startswith("User: ") else 0
+
+class RollingHistory:
+    """
+    FR-14: The session's Tier 1 history (formerly a list of strings + TokenTally).
+    A deque of Turn records with a running token total: appending tokenizes only the
+    new line, evicting the oldest turns is O(evicted). The "\\n"-joined history is kept
+    as one buffer that new lines are added to and evicted lines are cut from lazily;
+    it is the only copy of the text, so rendering any suffix is a single slice and
+    line texts and chat messages are sliced out of it on demand.
+    Iterating yields the line texts, like the old list.
+    """
+
+    def __init__(self, lines=()):
+        self._turns = deque()
+        self.total = 0
+        self._buffer = ""     # Rendered lines, each followed by "\n", from absolute offset _base
+        self._base = 0
+        self._end = 0         # Absolute offset just past the newest line's "\n"
+        self._tail = []       # Lines appended since the buffer was last compacted
+        for line in lines:
+            self.append(line)
+
+    def append(self, text):
+        turn = Turn(text, self._end)
+        self._turns.append(turn)
+        self._tail.append(text + "\n")
+        self._end += len(text) + 1
+        self.total += turn.tokens
+        return turn
+
+    def _compact(self):
+        """Cuts evicted lines off the front of the buffer and adds new ones at the back (one copy)."""
+        if not self._turns or not (self._tail or self._turns[0].start != self._base):
+            return
+        cut = self._turns[0].start - self._base
+        if cut >= len(self._buffer):   # Evicted lines reach into the un-compacted tail
+            self._buffer = "".join(self._tail)[cut - len(self._buffer):]
+        else:
+            self._buffer = self._buffer[cut:] + "".join(self._tail)
+        self._base = self._turns[0].start
+        self._tail = []
+
+    def _text(self, turn):
+        # Callers compact first, so every live turn is inside the buffer
+        offset = turn.start - self._base
+        return self._buffer[offset:offset + turn.length]
+
+    def _window(self, last):
+        """The newest `last` turns (all by default), oldest first, with the buffer compacted."""
+        n = len(self._turns) if last is None else min(last, len(self._turns))
+        self._compact()
+        return [self._turns[i] for i in range(-n, 0)] if n else []
+
+    def drop_oldest(self, n):
+        """Removes the n oldest turns. Returns their texts, oldest first."""
+        self._compact()
+        removed = []
+        for _ in range(min(n, len(self._turns))):
+            turn = self._turns.popleft()
+            self.total -= turn.tokens
+            removed.append(self._text(turn))
+        if not self._turns:
+            self._buffer, self._base, self._tail = "", self._end, []
+        return removed
+
+    def drop_oldest_quarter(self):
+        """FR-07: Evicts the oldest 25% of turns (at least one). Returns their texts."""
+        return self.drop_oldest(max(1, len(self._turns) // 4))
+
+    def turns(self):
+        """(text, tokens) of every turn, oldest first."""
+        return [(self._text(turn), turn.tokens) for turn in self._window(None)]
+
+    def texts(self, last=None):
+        """Texts of the newest `last` turns (all by default), oldest first."""
+        return [self._text(turn) for turn in self._window(last)]
+
+    def messages(self, last=None):
+        """Chat messages of the newest `last` turns (all by default), built from the buffer."""
+        return [{"role": turn.role, "content": self._text(turn)[turn.skip:]} for turn in self._window(last)]
+
+    def render(self, last=None):
+        """'\\n'.join of the newest `last` turns (all by default), sliced from the buffer."""
+        window = self._window(last)
+        if not window:
+            return ""
+        return self._buffer[window[0].start - self._base:-1]
+
+    def __len__(self):
+        return len(self._turns)
+
+    def __iter__(self):
+        return iter(self.texts())
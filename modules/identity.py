@@ -3,9 +3,15 @@ import os
 from datetime import datetime
 from modules.tokenizer_tool import count_tokens
 
-def load_identity():
+def current_time():
+    """FR-12 temporal data, to the minute."""
+    return datetime.now().strftime("%A, %B %d, %Y at %I:%M %p")
+
+def load_identity(include_time=True):
     """
     FR-08 & FR-12: Load Identity + Temporal Data + Budget Check
+    include_time=False keeps the block byte-stable across turns (chat mode sends
+    the time with the volatile context at the end of the prompt instead).
     """
     profile_path = os.path.join('data', 'user_profile.json')
     
@@ -13,13 +19,12 @@ def load_identity():
         data = json.load(f)
     
     # 1. Generate Temporal Data
-    current_time = datetime.now().strftime("%A, %B %d, %Y at %I:%M %p")
+    time_line = f"Current Time: {current_time()}\n" if include_time else ""
     
     # 2. Construct the Persona Block
     persona_block = f"""
 [SYSTEM OVERHEAD / TIER 0]
-Current Time: {current_time}
-User: {data['user_name']}
+{time_line}User: {data['user_name']}
 Assistant: {data['assistant_name']}
 
 PREFERENCES: {", ".join(data['core_preferences'])}
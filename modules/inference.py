@@ -1,30 +1,98 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
 import ollama
+from modules.response_cache import get_cache
+from modules.model_router import ModelRouter
+from modules import telemetry
+
+# Interactive turns use MODEL_NAME; Tier 2 summaries, digests and the exit reflection
+# use the (smaller) SUMMARY_MODEL. Set both to the same name to run a single model.
+MODEL_NAME = os.environ.get("NEXUS_CHAT_MODEL", "llama3.2")
+SUMMARY_MODEL = os.environ.get("NEXUS_SUMMARY_MODEL", "llama3.2:1b")
+CHAT_KEEP_ALIVE = '1h'        # The KV cache only helps while the model stays resident
+SUMMARY_KEEP_ALIVE = os.environ.get("NEXUS_SUMMARY_KEEP_ALIVE", "15m")
+
+# Explicit context window: without num_ctx Ollama falls back to its default and
+# silently truncates longer prompts. The prompt budget (modules.context_packer) is capped to fit in it.
+CONTEXT_WINDOW = int(os.environ.get("NEXUS_NUM_CTX", "8192"))
+
+GENERATION_OPTIONS = {
+    "num_ctx": CONTEXT_WINDOW,
+    "num_predict": 4096,    # High output limit remains for long explanations
+    "temperature": 0.5,     # Increased to 0.5 for more natural, less "robotic" flow
+    "top_p": 0.9,
+    "repeat_penalty": 1.1,
+    "stop": ["USER:", "ALFRED:"]
+}
+
+# Exact-prompt response cache in front of Ollama (NEXUS_RESPONSE_CACHE=0 disables it)
+RESPONSE_CACHE = os.environ.get("NEXUS_RESPONSE_CACHE", "1") == "1"
+
+# "chat" keeps a byte-stable prefix and uses the chat API so Ollama reuses its KV cache;
+# "flat" is the original single-string generate() prompt.
+PROMPT_MODE = os.environ.get("NEXUS_PROMPT_MODE", "chat")
+
+# Anything exposing ollama's generate()/chat() signatures: the module itself,
+# an ollama.Client pointed at a fake server, or a stub in tests.
+_client = ollama
+
+# Interactive turns in flight. Background jobs (Tier 2 summaries) yield to them.
+_foreground_turns = 0
+_foreground_idle = threading.Condition()
+
+_router = ModelRouter(
+    lambda: _client,
+    {"chat": MODEL_NAME, "summarize": SUMMARY_MODEL},
+    {"chat": CHAT_KEEP_ALIVE, "summarize": SUMMARY_KEEP_ALIVE},
+)
+
+def get_router():
+    return _router
+
+def set_client(client):
+    """Swaps the Ollama backend (e.g. ollama.Client(host=...) for a local fake server)."""
+    global _client
+    _client = client
+
+@contextmanager
+def foreground_request():
+    """Marks an interactive generation so background work holds off until it finishes."""
+    global _foreground_turns
+    with _foreground_idle:
+        _foreground_turns += 1
+    try:
+        yield
+    finally:
+        with _foreground_idle:
+            _foreground_turns -= 1
+            _foreground_idle.notify_all()
+
+def wait_for_foreground_idle(timeout=None):
+    """Blocks a background worker while any interactive turn is generating."""
+    with _foreground_idle:
+        return _foreground_idle.wait_for(lambda: _foreground_turns == 0, timeout)
 
 def heartbeat_warmup():
     """
     FR-01: Heartbeat Warm-up.
-    Ensures model is in VRAM with a 1-hour keep_alive.
+    Ensures the chat model is in VRAM with a 1-hour keep_alive; the summary
+    model is loaded in the background (background jobs borrow the chat model until then).
     """
     print("Nexus Core: Initializing Heartbeat (FR-01)...")
     try:
-        ollama.generate(
-            model='llama3.2:latest', 
-            prompt='', 
-            keep_alive='1h',
-            options={"num_predict": 1}
-        )
-        print("Nexus Core: Weights pre-loaded. System Ready.")
+        model = _router.warm("chat")
+        print(f"Nexus Core: Weights pre-loaded ({model}). System Ready.")
+        if SUMMARY_MODEL != model:
+            _router.warm_async("summarize")
         return True
     except Exception as e:
         print(f"Nexus Core: Heartbeat Failed. Error: {e}")
         return False
 
-def chat_inference(persona, context, user_input):
-    """
-    Nexus Loop (FR-16) - General Purpose Mega-Capacity.
-    Balanced for high-context conversations and long, natural responses.
-    """
-    
+def build_prompt(persona, context, user_input):
+    """Assembles the flat persona + context + user prompt sent to Ollama."""
     # Create a subtle boundary for history
     memory_block = ""
     if context:
@@ -35,25 +103,185 @@ def chat_inference(persona, context, user_input):
         )
 
     # Clean, persona-driven prompt structure
-    full_prompt = (
+    return (
         f"{persona}\n"
         f"{memory_block}\n"
         f"USER: {user_input}\n"
         f"ALFRED:"
     )
-    
-    # 
-
-    response = ollama.generate(
-        model='llama3.2',
-        prompt=full_prompt,
-        options={
-            "num_predict": 4096,    # High output limit remains for long explanations
-            "temperature": 0.5,     # Increased to 0.5 for more natural, less "robotic" flow
-            "top_p": 0.9,
-            "repeat_penalty": 1.1,
-            "stop": ["USER:", "ALFRED:"]
-        }
+
+def _response_cache(use_cache):
+    return get_cache() if use_cache and RESPONSE_CACHE else None
+
+@telemetry.traced("llm.chat_inference")
+def chat_inference(persona, context, user_input, use_cache=True, role="chat"):
+    """
+    Nexus Loop (FR-16) - General Purpose Mega-Capacity.
+    Balanced for high-context conversations and long, natural responses.
+    role="summarize" routes background work to SUMMARY_MODEL (see ModelRouter).
+    """
+    cache = _response_cache(use_cache)
+    if cache is not None:
+        cached = cache.get(_router.resolve(role), persona, context, user_input, GENERATION_OPTIONS)
+        if cached is not None:
+            return cached
+
+    def request(model, keep_alive):
+        return model, _client.generate(
+            model=model,
+            prompt=build_prompt(persona, context, user_input),
+            options=GENERATION_OPTIONS,
+            keep_alive=keep_alive
+        )
+    model, response = _router.call(role, request)
+
+    text = response['response'].strip()
+    if cache is not None:
+        cache.put(model, persona, context, user_input, GENERATION_OPTIONS, text)
+    return text
+
+def _cached_stream(cached, started, stats):
+    """Replays a cache hit through the streaming interface as a single piece."""
+    yield cached
+    telemetry.count("response_cache.hit")
+    if stats is not None:
+        elapsed = time.perf_counter() - started
+        stats.update({"ttft": elapsed, "total": elapsed, "tokens": 0, "tokens_per_sec": 0.0, "cached": True})
+    return cached
+
+def _consume_stream(stream, piece_of, started, stats):
+    """Yields text pieces from an Ollama stream; returns the stripped full text."""
+    first_token_at = None
+    pieces = []
+    final = {}
+    for chunk in stream:
+        piece = piece_of(chunk) or ""
+        if not pieces:
+            # Leading whitespace would be stripped from the stored reply anyway
+            piece = piece.lstrip()
+        if piece:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            pieces.append(piece)
+            yield piece
+        if chunk.get('done'):
+            final = chunk
+
+    finished = time.perf_counter()
+    if stats is not None:
+        stats.update(_stream_stats(started, first_token_at, finished, len(pieces), final))
+    if telemetry.ENABLED:
+        # Ollama's own split of the turn: prompt evaluation vs. token generation
+        telemetry.record("ollama.prompt_eval", (final.get('prompt_eval_duration') or 0) / 1e9)
+        telemetry.record("ollama.eval", (final.get('eval_duration') or 0) / 1e9)
+        if first_token_at is not None:
+            telemetry.record("ollama.ttft", first_token_at - started)
+        telemetry.record("ollama.stream", finished - started)
+    return "".join(pieces).strip()
+
+def stream_inference(persona, context, user_input, stats=None, use_cache=True):
+    """
+    Streaming variant of chat_inference.
+    Yields text pieces as Ollama produces them. The generator's return value
+    is the full stripped reply, and `stats` (if given) receives
+    time-to-first-token and tokens/sec once the stream is done.
+    """
+    started = time.perf_counter()
+    cache = _response_cache(use_cache)
+    if cache is not None:
+        cached = cache.get(_router.resolve("chat"), persona, context, user_input, GENERATION_OPTIONS)
+        if cached is not None:
+            return (yield from _cached_stream(cached, started, stats))
+
+    model, stream = _router.call_stream("chat", lambda model, keep_alive: _client.generate(
+        model=model,
+        prompt=build_prompt(persona, context, user_input),
+        options=GENERATION_OPTIONS,
+        keep_alive=keep_alive,
+        stream=True
+    ))
+    text = yield from _consume_stream(stream, lambda chunk: chunk.get('response'), started, stats)
+    if cache is not None:
+        cache.put(model, persona, context, user_input, GENERATION_OPTIONS, text)
+    return text
+
+# --- KV-CACHE FRIENDLY CHAT MODE ---
+
+# Static rules live in the system message so the whole prefix is byte-stable
+CHAT_RULES = """
+### INSTRUCTIONS ###
+You are ALFRED. Use the [TIER 3] or [TIER 2] data in the conversational context as your absolute source of truth.
+If data conflicts, prioritize the entry specifically flagged in the SYSTEM warning.
+"""
+
+def history_to_messages(history):
+    """Converts rolling_history lines ('User: ...' / 'ALFRED: ...') into chat messages."""
+    messages = []
+    for line in history:
+        if line.startswith("ALFRED: "):
+            messages.append({"role": "assistant", "content": line[len("ALFRED: "):]})
+        else:
+            messages.append({"role": "user", "content": line[len("User: "):] if line.startswith("User: ") else line})
+    return messages
+
+def build_messages(persona, history, volatile, user_input, history_messages=None):
+    """
+    Orders the prompt so Ollama can reuse its KV cache between turns:
+    [stable persona + rules] [past turns, verbatim] [volatile context + new input].
+    Only the tail (last turn + this one) changes, so prompt eval scales with the
+    new turn instead of the whole conversation.
+    history_messages, if given, is `history` already converted (RollingHistory.messages).
+    """
+    final_turn = user_input
+    if volatile:
+        final_turn = f"[CONVERSATIONAL_CONTEXT]\n{volatile}\n[END_OF_CONTEXT]\n\n{user_input}"
+    return (
+        [{"role": "system", "content": f"{persona}\n{CHAT_RULES}"}]
+        + (history_messages if history_messages is not None else history_to_messages(history))
+        + [{"role": "user", "content": final_turn}]
     )
-    
-    return response['response'].strip()
\ No newline at end of file
+
+def stream_chat(persona, history, volatile, user_input, stats=None, use_cache=True,
+                history_str=None, history_messages=None, cache_volatile=None):
+    """
+    Streaming chat-API turn (see build_messages). Same contract as stream_inference.
+    history_str / history_messages are optional pre-rendered forms of `history`.
+    cache_volatile is the part of `volatile` the response cache keys on (all of it by
+    default); leave out per-turn data such as the clock so a repeated turn still hits.
+    """
+    started = time.perf_counter()
+    if history_str is None:
+        history_str = "\n".join(history)
+    context_key = history_str + "\n" + (volatile if cache_volatile is None else cache_volatile or "")
+    cache = _response_cache(use_cache)
+    if cache is not None:
+        cached = cache.get(_router.resolve("chat"), persona, context_key, user_input, GENERATION_OPTIONS)
+        if cached is not None:
+            return (yield from _cached_stream(cached, started, stats))
+
+    model, stream = _router.call_stream("chat", lambda model, keep_alive: _client.chat(
+        model=model,
+        messages=build_messages(persona, history, volatile, user_input, history_messages),
+        options=GENERATION_OPTIONS,
+        keep_alive=keep_alive,
+        stream=True
+    ))
+    text = yield from _consume_stream(stream, lambda chunk: (chunk.get('message') or {}).get('content'), started, stats)
+    if cache is not None:
+        cache.put(model, persona, context_key, user_input, GENERATION_OPTIONS, text)
+    return text
+
+def _stream_stats(started, first_token_at, finished, n_pieces, final):
+    """Prefers Ollama's own eval counters; falls back to wall-clock over received chunks."""
+    eval_count = final.get('eval_count') or n_pieces
+    eval_duration = (final.get('eval_duration') or 0) / 1e9
+    if not eval_duration and first_token_at is not None:
+        eval_duration = finished - first_token_at
+    return {
+        "ttft": (first_token_at - started) if first_token_at is not None else None,
+        "total": finished - started,
+        "tokens": eval_count,
+        "tokens_per_sec": (eval_count / eval_duration) if eval_duration > 0 else 0.0,
+        "prompt_eval_count": final.get('prompt_eval_count') or 0,
+        "prompt_eval_ms": (final.get('prompt_eval_duration') or 0) / 1e6,
+    }
@@ -1,14 +1,40 @@
 import os
 import hashlib
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image
 import pytesseract
 from tqdm import tqdm # Required for FR-15 TUI Progress Bar
-from modules.vault_engine import vault # Tier 3 ChromaDB collection
+from modules.chunker import chunk_text
+from modules.embedding_backends import backend_signature
+from modules.manifest import IngestManifest, manifest_path_for
+from modules.telemetry import traced
+
+try:
+    import psutil # Optional: CPU load + temperature readings for FR-05 throttling
+except ImportError:
+    psutil = None
 
 # --- CONFIGURATION ---
 DOCS_DIR = os.path.join("data", "docs")
 
+# FR-05: Pipelined ingestion
+INGEST_WORKERS = max(1, (os.cpu_count() or 2) - 1)   # Leave a core for the REPL / Ollama
+INGEST_BATCH_SIZE = 32        # Files per vault.add (all their chunks form one embedding batch)
+CPU_LOAD_TARGET = 85.0        # % above which we back off between batches
+TEMP_LIMIT_C = 80.0           # Package temperature that triggers a cool-down
+MAX_BATCH_PAUSE = 10.0        # Longest back-off between batches (the old fixed per-file delay)
+MAX_COOLDOWN = 60.0
+FALLBACK_PAUSE = 2.0          # Used when neither load nor temperature can be measured
+
+# Watch mode
+WATCH_DEBOUNCE = 2.0          # Quiet period after the last file event before re-syncing
+WATCH_POLL_INTERVAL = 30.0    # Used when watchdog (inotify) isn't installed
+
+# One sync at a time: /ingest and the watcher share the manifest and the vault
+_sync_lock = threading.Lock()
+
 # Chocolatey/System Tesseract Path Configuration
 tess_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
@@ -30,16 +56,19 @@ def get_file_hash(file_path):
             hasher.update(chunk)
     return hasher.hexdigest()
 
-def process_file(file_name):
-    """Extracts text and adds to Tier 3 Vault."""
-    path = os.path.join(DOCS_DIR, file_name)
-    file_hash = get_file_hash(path)
-    
-    # FR-13: De-duplication check against the vector store
-    existing = vault.get(ids=[file_hash])
-    if existing and existing['ids']:
-        return "duplicate"
+def chunk_id(file_hash, chunk_index):
+    """Vault id of one chunk. Whole-file entries from before chunking use the bare hash."""
+    return f"{file_hash}:{chunk_index}"
+
+def is_legacy_id(vault_id):
+    return ":" not in vault_id
 
+def extract_file(path):
+    """
+    Hashes a file, extracts its text (OCR for images) and splits it into token chunks.
+    Runs inside the ingestion process pool, so it must not touch the vault.
+    """
+    file_name = os.path.basename(path)
     content = ""
     # FR-10: Multi-Modal Ingestion (OCR for Images)
     if file_name.lower().endswith(('.png', '.jpg', '.jpeg')):
@@ -49,53 +78,317 @@ def process_file(file_name):
                 content = pytesseract.image_to_string(img)
         except Exception as e:
             print(f"\n[!] OCR Error on {file_name}: {e}")
-            
+
     # Standard Text Ingestion
     elif file_name.lower().endswith('.txt'):
         with open(path, 'r', encoding='utf-8') as f:
             content = f.read()
-    
-    if content.strip():
-        # FR-16: Include timestamp and source for Conflict Orchestration
-        vault.add(
-            documents=[content],
-            metadatas=[{
-                "source_origin": file_name, 
-                "timestamp": time.time(), # Critical for FR-16 "Current Truth" logic
-                "hash": file_hash
-            }],
-            ids=[file_hash]
-        )
+
+    chunks = chunk_text(content) if content.strip() else []
+    return {"path": path, "file_name": file_name, "hash": get_file_hash(path), "content": content, "chunks": chunks}
+
+@traced("ingest.store_documents")
+def store_documents(docs, collection=None):
+    """
+    Adds extracted documents to Tier 3 in one embedding batch.
+    FR-13: Skips anything already in the vault (or repeated within the batch).
+    Sets doc["ids"] to the vault ids holding each document's content.
+    Returns (added, duplicates, empty).
+    """
+    if collection is None:
+        from modules.vault_engine import vault as collection # Tier 3 ChromaDB collection
+
+    empty = [d for d in docs if not d["content"].strip()]
+    unique = {}
+    for doc in docs:
+        if doc["content"].strip():
+            unique.setdefault(doc["hash"], doc)
+
+    # A file is already stored if its first chunk exists. A legacy whole-file entry
+    # (from before chunking) is replaced by chunks, so old and new passages never mix.
+    probe_ids = [chunk_id(h, 0) for h in unique] + list(unique)
+    existing = set(collection.get(ids=probe_ids)["ids"]) if unique else set()
+    legacy = [h for h in unique if h in existing and chunk_id(h, 0) not in existing]
+    fresh = [doc for file_hash, doc in unique.items() if chunk_id(file_hash, 0) not in existing]
+
+    if fresh:
+        now = time.time()
+        documents, metadatas, ids = [], [], []
+        for doc in fresh:
+            for chunk in doc["chunks"]:
+                documents.append(chunk["text"])
+                # FR-16: Include timestamp and source for Conflict Orchestration
+                metadatas.append({
+                    "source_origin": doc["file_name"],
+                    "timestamp": now, # Critical for FR-16 "Current Truth" logic
+                    "hash": doc["hash"],
+                    "parent_hash": doc["hash"],
+                    "chunk_index": chunk["chunk_index"],
+                    "chunk_count": len(doc["chunks"]),
+                    "token_start": chunk["token_start"],
+                    "token_end": chunk["token_end"]
+                })
+                ids.append(chunk_id(doc["hash"], chunk["chunk_index"]))
+        collection.add(documents=documents, metadatas=metadatas, ids=ids)
+    if legacy:
+        collection.delete(ids=legacy)
+
+    for doc in docs:
+        if not doc["content"].strip():
+            doc["ids"] = []
+        else:
+            doc["ids"] = [chunk_id(doc["hash"], c["chunk_index"]) for c in doc["chunks"]]
+    non_empty = len(docs) - len(empty)
+    return len(fresh), non_empty - len(fresh), len(empty)
+
+def process_file(file_name, collection=None):
+    """Extracts text and adds to Tier 3 Vault."""
+    added, duplicates, _ = store_documents([extract_file(os.path.join(DOCS_DIR, file_name))], collection)
+    if added:
         return "success"
-    return "empty"
+    return "duplicate" if duplicates else "empty"
+
+# --- FR-05: ADAPTIVE THROTTLING ---
+
+def measure_load():
+    """Returns (cpu_percent, max_temp_c); either may be None if the platform can't tell us."""
+    cpu, temp = None, None
+    if psutil is not None:
+        cpu = psutil.cpu_percent(interval=None)
+        try:
+            readings = psutil.sensors_temperatures() # Linux/BSD only
+            temps = [t.current for entries in readings.values() for t in entries if t.current]
+            temp = max(temps) if temps else None
+        except (AttributeError, OSError):
+            pass
+    elif hasattr(os, "getloadavg"):
+        cpu = min(100.0, os.getloadavg()[0] / (os.cpu_count() or 1) * 100.0)
+    return cpu, temp
+
+def adaptive_pause():
+    """
+    FR-05: Thermal/CPU back-off between embedding batches.
+    Replaces the fixed 10s per-file sleep: no pause while the machine has headroom,
+    a proportional pause above the load target, and a cool-down above TEMP_LIMIT_C.
+    Returns the seconds slept.
+    """
+    cpu, temp = measure_load()
+    if cpu is None and temp is None:
+        time.sleep(FALLBACK_PAUSE)
+        return FALLBACK_PAUSE
+
+    slept = 0.0
+    if cpu is not None and cpu > CPU_LOAD_TARGET:
+        pause = MAX_BATCH_PAUSE * (cpu - CPU_LOAD_TARGET) / (100.0 - CPU_LOAD_TARGET)
+        time.sleep(pause)
+        slept += pause
 
-def sync_docs_folder():
+    while temp is not None and temp > TEMP_LIMIT_C and slept < MAX_COOLDOWN:
+        time.sleep(2.0)
+        slept += 2.0
+        _, temp = measure_load()
+    return slept
+
+# --- PIPELINE ---
+
+def scan_docs(docs_dir):
+    """stat()-only listing: {absolute path: (size, mtime_ns)}. No file is opened."""
+    found = {}
+    with os.scandir(docs_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            st = entry.stat()
+            found[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime_ns)
+    return found
+
+def purge_files(collection, manifest, known, paths):
+    """Deletes the vectors of `paths`, except chunks another file still shares."""
+    still_owned = manifest.referenced_ids(exclude_paths=paths)
+    doomed = list(dict.fromkeys(
+        i for p in paths for i in known[p]["chunk_ids"] if i not in still_owned
+    ))
+    if doomed:
+        collection.delete(ids=doomed)
+    return len(doomed)
+
+@traced("ingest.sync")
+def sync_docs_folder(docs_dir=DOCS_DIR, collection=None, workers=INGEST_WORKERS,
+                     batch_size=INGEST_BATCH_SIZE, manifest_path=None, verbose=True):
     """
     FR-05: Throttled Ingestion.
     FR-15: TUI Ingestion Queue Progress Bar.
+    FR-13: Manifest-driven incremental sync. Files whose size and mtime match the
+    manifest are skipped without being read; changed files have their old vectors
+    replaced and deleted files are purged from the vault. Files still held as a
+    legacy whole-file entry are re-chunked once.
+    Syncs never overlap: a second caller waits for the running one to finish.
+    """
+    with _sync_lock:
+        return _sync_docs_folder(docs_dir, collection, workers, batch_size, manifest_path, verbose)
+
+def _sync_docs_folder(docs_dir, collection, workers, batch_size, manifest_path, verbose):
+    if not os.path.exists(docs_dir):
+        os.makedirs(docs_dir)
+
+    started = time.perf_counter()
+    files = scan_docs(docs_dir)
+    manifest = IngestManifest(manifest_path or manifest_path_for(backend_signature()))
+    try:
+        known = manifest.entries(docs_dir)
+        removed = [p for p in known if p not in files]
+        # Files still stored as one legacy whole-file entry are re-chunked even if unchanged
+        candidates = [p for p, stat in files.items()
+                      if p not in known or (known[p]["size"], known[p]["mtime_ns"]) != stat
+                      or any(map(is_legacy_id, known[p]["chunk_ids"]))]
+
+        totals = {"files": len(files), "unchanged": len(files) - len(candidates), "added": 0,
+                  "updated": 0, "duplicates": 0, "empty": 0, "removed": len(removed),
+                  "errors": 0, "throttled": 0.0}
+
+        if not files and not known:
+            print("[!] No files found in /docs/ to ingest.")
+            return None
+
+        if candidates or removed:
+            if collection is None:
+                from modules.vault_engine import vault as collection # Tier 3 ChromaDB collection
+            if removed:
+                purge_files(collection, manifest, known, removed)
+                manifest.forget(removed)
+            if candidates:
+                if verbose:
+                    print(f"[*] Nexus Core: Syncing {len(candidates)} new or modified files to Tier 3...")
+                _ingest_candidates(candidates, files, known, manifest, collection, workers, batch_size, totals, verbose)
+    finally:
+        manifest.close()
+
+    if totals["added"] or totals["updated"] or totals["removed"]:
+        # Cached answers may quote documents that just changed
+        from modules.response_cache import invalidate_cache
+        invalidate_cache("vault changed")
+
+    totals["seconds"] = time.perf_counter() - started
+    totals["files_per_sec"] = totals["files"] / totals["seconds"] if totals["seconds"] else 0.0
+    if verbose or candidates or removed:
+        print(f"[*] Ingestion Cycle Complete. {totals['added']} added, {totals['updated']} updated, "
+              f"{totals['removed']} removed, {totals['duplicates']} duplicates, {totals['unchanged']} unchanged "
+              f"({totals['seconds'] * 1000:.0f} ms).")
+    return totals
+
+def _ingest_candidates(candidates, files, known, manifest, collection, workers, batch_size, totals, verbose):
+    """Hashing/OCR run in a process pool while finished files are embedded in batches."""
+    batch = []
+
+    def flush():
+        # Touched but identical content: refresh the stat, keep the vectors
+        touched = [d for d in batch if d["path"] in known and known[d["path"]]["hash"] == d["hash"]
+                   and not any(map(is_legacy_id, known[d["path"]]["chunk_ids"]))]
+        touched_paths = {d["path"] for d in touched}
+        changed = [d for d in batch if d["path"] not in touched_paths]
+        stale = [d["path"] for d in changed if d["path"] in known]
+        if stale:
+            purge_files(collection, manifest, known, stale)
+            totals["updated"] += len(stale)
+
+        added, duplicates, empty = store_documents(changed, collection) if changed else (0, 0, 0)
+        totals["added"] += added
+        totals["duplicates"] += duplicates
+        totals["empty"] += empty
+        for doc in touched:
+            doc["ids"] = known[doc["path"]]["chunk_ids"]
+        manifest.record([(d["path"], *files[d["path"]], d["hash"], d["ids"]) for d in batch])
+        batch.clear()
+        if added:
+            totals["throttled"] += adaptive_pause()
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(candidates))) as pool:
+        futures = {pool.submit(extract_file, path): path for path in candidates}
+        # FR-15: Implementation of the TUI Ingestion Queue progress bar
+        progress = tqdm(as_completed(futures), total=len(futures), desc="Ingesting Vault",
+                        unit="file", colour="green", disable=not verbose)
+        for future in progress:
+            try:
+                batch.append(future.result())
+            except Exception as e:
+                totals["errors"] += 1
+                print(f"\n[!] Ingestion Error on {os.path.basename(futures[future])}: {e}")
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+# --- WATCH MODE ---
+
+class DocsWatcher:
+    """
+    Keeps Tier 3 in sync with the docs folder without manual /ingest.
+    Uses watchdog (inotify / FSEvents / ReadDirectoryChangesW) when installed and
+    falls back to cheap manifest polling otherwise. Bursts of events are debounced.
     """
-    if not os.path.exists(DOCS_DIR):
-        os.makedirs(DOCS_DIR)
-        
-    files = [f for f in os.listdir(DOCS_DIR) if not f.startswith('.')]
-    if not files:
-        print("[!] No files found in /docs/ to ingest.")
-        return
-
-    print(f"[*] Nexus Core: Syncing {len(files)} files to Tier 3...")
-    
-    # FR-15: Implementation of the TUI Ingestion Queue progress bar
-    for f in tqdm(files, desc="Ingesting Vault", unit="file", colour="green"):
-        status = process_file(f)
-        
-        if status == "success":
-            # FR-05: 10-second delay to prevent CPU thermal throttling
-            time.sleep(10) 
-        elif status == "duplicate":
-            # No delay needed for skipped files
-            continue 
-    
-    print("[*] Ingestion Cycle Complete.")
+
+    def __init__(self, docs_dir=DOCS_DIR, debounce=WATCH_DEBOUNCE, poll_interval=WATCH_POLL_INTERVAL):
+        self.docs_dir = docs_dir
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._dirty = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.docs_dir, exist_ok=True)
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            print(f"[*] watchdog not installed; polling {self.docs_dir} every {self.poll_interval:.0f}s.")
+        else:
+            dirty = self._dirty
+
+            class _Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    dirty.set()
+
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), self.docs_dir, recursive=False)
+            self._observer.start()
+        self._dirty.set() # Catch up on anything that changed while we weren't watching
+        self._thread = threading.Thread(target=self._loop, name="docs-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self._observer is not None or self._dirty.is_set():
+                if not self._dirty.wait(0.5):
+                    continue
+                # Debounce: wait for a quiet period so a copy of many files is one sync
+                while self._dirty.is_set() and not self._stop.is_set():
+                    self._dirty.clear()
+                    self._stop.wait(self.debounce)
+            elif self._stop.wait(self.poll_interval):
+                break
+            if self._stop.is_set():
+                break
+            if _sync_lock.locked():
+                # An /ingest is running; look again after the next debounce instead of queueing behind it
+                self._dirty.set()
+                self._stop.wait(self.debounce)
+                continue
+            try:
+                sync_docs_folder(self.docs_dir, verbose=False)
+            except Exception as e:
+                print(f"\n[!] Watch sync failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
 
 if __name__ == "__main__":
-    sync_docs_folder()
\ No newline at end of file
+    sync_docs_folder()
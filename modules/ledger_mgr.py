@@ -1,101 +1,650 @@
 import sqlite3
 import os
+import re
 import hashlib
+import queue
+import threading
 import time  # Added time import
+from concurrent.futures import Future
 from datetime import datetime
 from modules.tokenizer_tool import count_tokens
+from modules.telemetry import traced
 
 DB_PATH = os.path.join("data", "nexus_logs.db")
 
-def initialize_ledger():
-    """Initializes the SQLite database with WAL mode and Phase 4 schema."""
-    os.makedirs("data", exist_ok=True) 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA journal_mode=WAL;")
-    # Changed timestamp type to REAL for float storage
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS session_summaries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp REAL NOT NULL, 
-            content TEXT NOT NULL,
-            is_archived INTEGER DEFAULT 0,
-            sha256_hash TEXT UNIQUE 
+# Tier 2 recall ranking: BM25 blended with an age decay so FR-16 keeps favouring fresh logs
+RECALL_CANDIDATES = 50
+RECALL_SCAN = 4000            # Newest FTS matches BM25-scored per query (older rows live on in digests)
+RECALL_POOL = 200             # Best-scored of those that get re-weighted by recency
+MIN_TERM_LENGTH = 3           # Shorter tokens ('a', 'is') are dropped from recall queries
+PREFIX_TERM_LENGTH = 5        # Shorter terms match exactly; a prefix on 'the' would match half the ledger
+STOPWORDS = frozenset("""
+    about after again all also and any are because been before being but can could did does doing
+    for from had has have her here him his how into its just like more most not now off once only
+    other our out over own same she should some such than that the their them then there these they
+    this those through too under until very was were what when where which while who whom why will
+    with would you your yours
+""".split())
+RECENCY_WEIGHT = 0.3          # 0.0 = pure BM25, 1.0 = fully age-scaled BM25
+RECENCY_HALF_LIFE_DAYS = 7.0
+
+# Connection pool sizing
+READER_POOL_SIZE = 4
+WRITE_BATCH_LIMIT = 256       # Max queued writes folded into one transaction
+STATEMENT_CACHE_SIZE = 128    # sqlite3 keeps compiled statements per connection, keyed by SQL text
+
+# FR-04: Hierarchical consolidation. Level 0 = session summaries; digests roll them up.
+DIGEST_LEVELS = {1: "daily", 2: "weekly", 3: "monthly"}
+RECALL_TOKEN_BUDGET = 800     # FR-14
+DRILL_DOWN_LIMIT = 16         # A digest with more matching sources than this stays whole
+RRF_K = 60                    # Hybrid recall: 1 / (RRF_K + rank) per lexical / vector list
+
+FTS_SCHEMA = [
+    # External-content FTS5 index over session_summaries.content
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS session_summaries_fts USING fts5(
+        content,
+        content='session_summaries',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS session_summaries_ai AFTER INSERT ON session_summaries BEGIN
+        INSERT INTO session_summaries_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS session_summaries_ad AFTER DELETE ON session_summaries BEGIN
+        INSERT INTO session_summaries_fts(session_summaries_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS session_summaries_au AFTER UPDATE OF content ON session_summaries BEGIN
+        INSERT INTO session_summaries_fts(session_summaries_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO session_summaries_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    ''',
+]
+
+# --- STATEMENTS (constant SQL text so the per-connection statement cache always hits) ---
+
+SQL_INSERT_SUMMARY = '''
+    INSERT OR IGNORE INTO session_summaries (timestamp, content, sha256_hash, session_id, is_archived)
+    VALUES (?, ?, ?, ?, 0)
+'''
+
+# Bounded whatever the ledger size: FTS5 walks its doclists newest-first and stops
+# after RECALL_SCAN matches (older summaries stay reachable through the digests that
+# roll them up), its rank (= bm25(), negative, lower = better) keeps the best
+# RECALL_POOL, and only those are scaled by the age decay, which pushes older
+# summaries down the ranking without hiding them. Scope filters apply to the pool,
+# so it is wider than the RECALL_CANDIDATES that come back.
+SQL_RECALL_RANKED = '''
+    SELECT s.id, s.content, s.timestamp, s.kind FROM (
+        SELECT rowid, rank FROM (
+            SELECT rowid, rank FROM session_summaries_fts
+            WHERE session_summaries_fts MATCH ?
+            ORDER BY rowid DESC
+            LIMIT ?
         )
-    ''')
-    conn.commit()
-    conn.close()
-    print(f"[*] Nexus Ledger initialized (WAL Mode).")
-
-def save_summary(content):
-    """Saves a summary. FR-13: Deduplicates via SHA256."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+        ORDER BY rank
+        LIMIT ?
+    ) AS c
+    JOIN session_summaries AS s ON s.id = c.rowid
+    WHERE s.is_archived = 0 AND s.session_id IS ?
+    ORDER BY c.rank * ((1.0 - ?) + ? / (1.0 + (? - s.timestamp) / ?))
+    LIMIT ?
+'''
+
+SQL_RECALL_RECENT = '''
+    SELECT id, content, timestamp, kind FROM session_summaries
+    WHERE is_archived = 0 AND session_id IS ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+
+# Coarse-to-fine: the matching sources a digest was built from (archived rows included)
+SQL_RECALL_CHILDREN = '''
+    SELECT s.id, s.content, s.timestamp, s.kind FROM session_summaries_fts
+    JOIN session_summaries AS s ON s.id = session_summaries_fts.rowid
+    JOIN summary_provenance AS p ON p.source_id = s.id
+    WHERE session_summaries_fts MATCH ? AND p.digest_id = ?
+    ORDER BY bm25(session_summaries_fts)
+    LIMIT ?
+'''
+
+SQL_CONSOLIDATION_CANDIDATES = '''
+    SELECT id, timestamp, content FROM session_summaries
+    WHERE is_archived = 0 AND level = ? AND session_id IS ? AND timestamp < ?
+    ORDER BY timestamp
+'''
+
+SQL_INSERT_DIGEST = '''
+    INSERT INTO session_summaries
+        (timestamp, content, sha256_hash, session_id, is_archived, level, kind, period_start, period_end)
+    VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)
+'''
+
+# A period's only active row moves up a level in place instead of being copied into a digest
+SQL_PROMOTE = '''
+    UPDATE session_summaries SET level = ?, period_start = ?, period_end = ?, embedded_sig = NULL
+    WHERE id = ? AND level = ? AND is_archived = 0
+'''
+
+SQL_ACTIVE_SCOPES = "SELECT DISTINCT session_id FROM session_summaries WHERE is_archived = 0"
+
+# Tier 2 vector index bookkeeping (modules.tier2_vectors): rows not yet embedded by the current backend.
+# Archiving or promoting a row clears its embedded_sig, so the indexer drops or re-tags its vector.
+SQL_UNEMBEDDED = '''
+    SELECT id, content, timestamp, level, session_id, is_archived FROM session_summaries
+    WHERE embedded_sig IS NOT ?
+    ORDER BY id
+    LIMIT ?
+'''
+
+def build_fts_query(query_text):
+    """
+    Turns free text into an OR-ed FTS5 query of its content words: stopwords and
+    tokens under MIN_TERM_LENGTH are dropped, short terms match exactly and longer
+    ones by prefix. Returns None if no terms are left.
+    """
+    terms = [term for term in re.findall(r"\w+", query_text.lower())
+             if len(term) >= MIN_TERM_LENGTH and term not in STOPWORDS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"*' if len(term) >= PREFIX_TERM_LENGTH else f'"{term}"'
+                       for term in dict.fromkeys(terms))
+
+def summary_row(content, timestamp=None, session_id=None):
+    """
+    Builds the (timestamp, content, sha256, session_id) tuple for SQL_INSERT_SUMMARY.
+    FR-13 dedup key. session_id None is the local REPL (and every pre-server row);
+    server sessions salt the hash so identical text in two sessions is kept twice.
+    """
     # Changed to float for easier comparison (FR-16)
-    timestamp = time.time() 
-    
-    sha256_hash = hashlib.sha256(content.encode()).hexdigest()
-    try:
-        cursor.execute('''
-            INSERT INTO session_summaries (timestamp, content, sha256_hash, is_archived)
-            VALUES (?, ?, ?, 0)
-        ''', (timestamp, content, sha256_hash))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass 
-    finally:
+    timestamp = time.time() if timestamp is None else timestamp
+    key = content if session_id is None else f"{session_id}\0{content}"
+    return (timestamp, content, hashlib.sha256(key.encode()).hexdigest(), session_id)
+
+class Ledger:
+    """
+    Thread-safe Tier 2 store.
+    All writes go through one queue drained by a single writer thread, which folds
+    whatever is pending into one transaction. Reads borrow from a pool of WAL
+    reader connections, so background prune threads never hit "database is locked".
+    """
+
+    def __init__(self, db_path=DB_PATH, readers=READER_POOL_SIZE):
+        self.db_path = db_path
+        self._reader_slots = readers
+        self._readers = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._writer = None
+        self._closed = False
+
+    # --- CONNECTIONS ---
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.execute("PRAGMA busy_timeout = 30000;")
+        return conn
+
+    def _borrow_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._reader_slots > 0:
+                self._reader_slots -= 1
+                conn = self._connect()
+                conn.execute("PRAGMA query_only = 1;")
+                return conn
+        # Pool exhausted: wait for another thread to hand one back
+        return self._readers.get()
+
+    def _read(self, sql, params=()):
+        conn = self._borrow_reader()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self._readers.put(conn)
+
+    # --- WRITE QUEUE ---
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._writer_loop, name="ledger-writer", daemon=True)
+                    self._writer.start()
+
+    def _writer_loop(self):
+        conn = self._connect()
+        conn.isolation_level = None  # Explicit BEGIN/COMMIT around each batch
+        conn.execute("PRAGMA journal_mode=WAL;")
+        while True:
+            job = self._writes.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < WRITE_BATCH_LIMIT:
+                try:
+                    job = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._writes.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(job)
+            self._run_batch(conn, batch)
         conn.close()
 
-def recall_memory(query_text):
+    def _run_batch(self, conn, batch):
+        """
+        Runs one batch in a single transaction. Never raises: if the transaction itself
+        fails (e.g. BEGIN hits "database is locked"), every future in the batch gets the
+        error and the writer thread moves on to the next batch.
+        """
+        cursor = conn.cursor()
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for work, future in batch:
+                # A savepoint per job keeps one failure from rolling back its neighbours
+                cursor.execute("SAVEPOINT job")
+                try:
+                    results.append((future, work(cursor), None))
+                    cursor.execute("RELEASE job")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO job")
+                    cursor.execute("RELEASE job")
+                    results.append((future, None, e))
+            cursor.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                try:
+                    cursor.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            results = [(future, None, e) for _, future in batch]
+        for future, value, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def submit(self, work):
+        """Queues work(cursor) for the writer thread. Returns a Future with its result."""
+        if self._closed:
+            raise RuntimeError("Ledger is closed.")
+        self._ensure_writer()
+        future = Future()
+        self._writes.put((work, future))
+        return future
+
+    def flush(self):
+        """Blocks until every write queued so far is committed."""
+        self.submit(lambda cursor: None).result()
+
+    def close(self):
+        """Commits pending writes and releases every connection."""
+        if self._closed:
+            return
+        if self._writer is not None:
+            self.flush()
+            self._closed = True
+            self._writes.put(None)
+            self._writer.join()
+        self._closed = True
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # --- LEDGER API ---
+
+    def initialize(self):
+        """Initializes the SQLite database with WAL mode and Phase 4 schema."""
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        def create_schema(cursor):
+            # Changed timestamp type to REAL for float storage
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS session_summaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp REAL NOT NULL,
+                    content TEXT NOT NULL,
+                    is_archived INTEGER DEFAULT 0,
+                    sha256_hash TEXT UNIQUE
+                )
+            ''')
+
+            # Session scoping: rows written before server mode belong to the local REPL (NULL)
+            cursor.execute("PRAGMA table_info(session_summaries)")
+            columns = {row[1] for row in cursor.fetchall()}
+            if "session_id" not in columns:
+                cursor.execute("ALTER TABLE session_summaries ADD COLUMN session_id TEXT")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS session_summaries_scope ON session_summaries(session_id, is_archived, timestamp)"
+            )
+
+            # FR-04: Digest hierarchy. The old flat archive flag hid summaries for good, so
+            # rows archived before the hierarchy existed are released to be rolled up instead.
+            if "level" not in columns:
+                cursor.execute("ALTER TABLE session_summaries ADD COLUMN level INTEGER NOT NULL DEFAULT 0")
+                cursor.execute("ALTER TABLE session_summaries ADD COLUMN period_start REAL")
+                cursor.execute("ALTER TABLE session_summaries ADD COLUMN period_end REAL")
+                cursor.execute("UPDATE session_summaries SET is_archived = 0 WHERE is_archived = 1")
+            if "embedded_sig" not in columns:
+                cursor.execute("ALTER TABLE session_summaries ADD COLUMN embedded_sig TEXT")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS summary_provenance (
+                    digest_id INTEGER NOT NULL,
+                    source_id INTEGER NOT NULL,
+                    PRIMARY KEY (digest_id, source_id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS summary_provenance_source ON summary_provenance(source_id)")
+            # Recall labels a row by the granularity its text was written at (kind); promotion
+            # only moves level. Promoted rows from before the column have no sources, so read as 0.
+            if "kind" not in columns:
+                cursor.execute("ALTER TABLE session_summaries ADD COLUMN kind INTEGER NOT NULL DEFAULT 0")
+                cursor.execute(
+                    "UPDATE session_summaries SET kind = level "
+                    "WHERE level > 0 AND id IN (SELECT digest_id FROM summary_provenance)"
+                )
+
+            # FTS5 index for /recall. Ledgers created before the index existed are back-filled once.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'session_summaries_fts'")
+            needs_backfill = cursor.fetchone() is None
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+            if needs_backfill:
+                cursor.execute("INSERT INTO session_summaries_fts(session_summaries_fts) VALUES ('rebuild')")
+            return needs_backfill
+
+        if self.submit(create_schema).result():
+            print("[*] Tier 2 Migration: Full-text index built for existing summaries.")
+        print(f"[*] Nexus Ledger initialized (WAL Mode).")
+
+    def save_summary(self, content, wait=True, session_id=None):
+        """Saves a summary. FR-13: Deduplicates via SHA256."""
+        row = summary_row(content, session_id=session_id)
+        future = self.submit(lambda cursor: cursor.execute(SQL_INSERT_SUMMARY, row).rowcount)
+        return future.result() if wait else future
+
+    @traced("ledger.save_summaries")
+    def save_summaries(self, contents, wait=True, session_id=None):
+        """Batched save_summary: one executemany inside one transaction."""
+        rows = [summary_row(content, session_id=session_id) for content in contents]
+
+        def insert_all(cursor):
+            before = cursor.connection.total_changes
+            cursor.executemany(SQL_INSERT_SUMMARY, rows)
+            return cursor.connection.total_changes - before
+
+        future = self.submit(insert_all)
+        return future.result() if wait else future
+
+    @traced("ledger.recall_memory")
+    def recall_memory(self, query_text, recency_weight=RECENCY_WEIGHT, session_id=None, vector_hits=None):
+        """
+        FR-16 Update: Returns a dictionary containing the latest timestamp
+        as a float and the combined content for Conflict Orchestration.
+        Matches are BM25-ranked through the FTS5 index and blended with recency.
+        Only summaries written by session_id are visible.
+        FR-04: Search runs coarse to fine. Active rows (monthly/weekly/daily digests and
+        recent summaries) are ranked first; a matching digest is then replaced by all of
+        its matching sources, down to the original summaries, but only when they all fit
+        the remaining budget. Otherwise the digest itself stands in for them.
+        vector_hits ([summary id] nearest first, see modules.tier2_vectors) turns this
+        into hybrid search: both rankings are fused (RRF) and then decayed by age once.
+        """
+        fts_query = build_fts_query(query_text)
+
+        if fts_query and vector_hits:
+            lexical = self._read(SQL_RECALL_RANKED, (
+                fts_query, RECALL_SCAN, RECALL_POOL, session_id, 0.0, 0.0, time.time(),
+                RECENCY_HALF_LIFE_DAYS * 86400.0, RECALL_CANDIDATES
+            ))
+            rows = self._fuse(lexical, vector_hits, recency_weight, session_id)
+        elif fts_query:
+            rows = self._read(SQL_RECALL_RANKED, (
+                fts_query, RECALL_SCAN, RECALL_POOL, session_id, recency_weight, recency_weight, time.time(),
+                RECENCY_HALF_LIFE_DAYS * 86400.0, RECALL_CANDIDATES
+            ))
+        elif vector_hits:
+            rows = self._fuse([], vector_hits, recency_weight, session_id)
+        else:
+            # Bare /recall: most recent summaries first
+            rows = self._read(SQL_RECALL_RECENT, (session_id, RECALL_CANDIDATES))
+
+        if not rows:
+            return None
+
+        # latest_timestamp will now be a float (newest of the injected entries)
+        latest_timestamp = rows[0][2]
+        compiled_content = ""
+        compiled_tokens = 0
+        entries = []
+        seen = set()
+
+        def entry_of(row):
+            _, content, ts, kind = row
+            # Convert back to readable string only for the prompt injection
+            readable_ts = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+            label = f" {DIGEST_LEVELS[kind]} digest" if kind in DIGEST_LEVELS else ""
+            entry = f"\n[{readable_ts}{label}] {content}"
+            return entry, count_tokens(entry)
+
+        def expand(row, budget):
+            """
+            [(row, entry, tokens)]: the digest's matching sources (recursively) if all of
+            them fit in budget, else the digest, so no matching source silently drops out.
+            """
+            own = [(row, *entry_of(row))]
+            row_id, _, _, kind = row
+            if not fts_query or kind == 0:
+                return own
+            children = self._read(SQL_RECALL_CHILDREN, (fts_query, row_id, DRILL_DOWN_LIMIT + 1))
+            if not children or len(children) > DRILL_DOWN_LIMIT:
+                return own
+            leaves, used = [], 0
+            for child in children:
+                found = expand(child, budget - used)
+                leaves += found
+                used += sum(tokens for *_, tokens in found)
+                if used > budget:
+                    return own
+            return leaves
+
+        for row in rows:
+            for (row_id, _, ts, _), entry, entry_tokens in expand(row, RECALL_TOKEN_BUDGET - compiled_tokens):
+                if row_id in seen:
+                    continue
+                seen.add(row_id)
+                # FR-14: Respect the 800-token limit (only the new entry is tokenized)
+                if compiled_tokens + entry_tokens > RECALL_TOKEN_BUDGET:
+                    break
+                compiled_content += entry
+                compiled_tokens += entry_tokens
+                entries.append(entry.strip())
+                latest_timestamp = max(latest_timestamp, ts)
+            else:
+                continue
+            break
+
+        return {
+            "content": compiled_content.strip(),
+            "timestamp": latest_timestamp, # Returning the float
+            "source": "Tier 2 (Episodic)",
+            "entries": entries # Ranked, for the context packer
+        }
+
+    def _fuse(self, lexical, vector_hits, recency_weight, session_id):
+        """Reciprocal-rank fusion of BM25 rows and vector hits, scaled by the age decay."""
+        vector_hits = list(vector_hits)[:RECALL_CANDIDATES]
+        by_id = {row[0]: row for row in lexical}
+        missing = [i for i in vector_hits if i not in by_id]
+        if missing:
+            for row in self._read(
+                f"SELECT id, content, timestamp, kind FROM session_summaries "
+                f"WHERE is_archived = 0 AND session_id IS ? AND id IN ({','.join('?' * len(missing))})",
+                (session_id, *missing)
+            ):
+                by_id[row[0]] = row
+
+        scores = {}
+        for ranking in ([row[0] for row in lexical], vector_hits):
+            for rank, row_id in enumerate(i for i in ranking if i in by_id):
+                scores[row_id] = scores.get(row_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        now, half_life = time.time(), RECENCY_HALF_LIFE_DAYS * 86400.0
+        for row_id in scores:
+            age = max(0.0, now - by_id[row_id][2])
+            scores[row_id] *= (1.0 - recency_weight) + recency_weight / (1.0 + age / half_life)
+        ranked = sorted(scores, key=scores.get, reverse=True)[:RECALL_CANDIDATES]
+        return [by_id[row_id] for row_id in ranked]
+
+    # --- FR-04: CONSOLIDATION SUPPORT (driven by modules.consolidator) ---
+
+    def consolidation_candidates(self, level, session_id=None, before=None):
+        """Active rows of one level older than `before`: [(id, timestamp, content)] oldest first."""
+        before = time.time() if before is None else before
+        return self._read(SQL_CONSOLIDATION_CANDIDATES, (level, session_id, before))
+
+    def active_scopes(self):
+        """session_id of every scope with active rows (None is the local REPL)."""
+        return [row[0] for row in self._read(SQL_ACTIVE_SCOPES)]
+
+    def save_digest(self, content, level, period_start, period_end, source_ids, session_id=None):
+        """
+        Inserts a digest, links it to its sources and archives them, atomically.
+        Fails (and changes nothing) if any source was already rolled up elsewhere.
+        """
+        source_ids = list(source_ids)
+        key = f"L{level}:{period_start}:{session_id}\0{content}"
+        digest_hash = hashlib.sha256(key.encode()).hexdigest()
+        marks = ",".join("?" * len(source_ids))
+
+        def insert(cursor):
+            changes = cursor.connection.total_changes
+            cursor.execute(
+                f"UPDATE session_summaries SET is_archived = 1, embedded_sig = NULL "
+                f"WHERE is_archived = 0 AND id IN ({marks})",
+                source_ids
+            )
+            if cursor.connection.total_changes - changes != len(source_ids):
+                raise RuntimeError("Consolidation sources changed underneath the digest.")
+            # The digest sorts (FR-16) as recent as its newest source
+            cursor.execute(f"SELECT MAX(timestamp) FROM session_summaries WHERE id IN ({marks})", source_ids)
+            timestamp = cursor.fetchone()[0]
+            cursor.execute(SQL_INSERT_DIGEST, (timestamp, content, digest_hash, session_id,
+                                               level, level, period_start, period_end))
+            digest_id = cursor.lastrowid
+            cursor.executemany("INSERT INTO summary_provenance (digest_id, source_id) VALUES (?, ?)",
+                               [(digest_id, source_id) for source_id in source_ids])
+            return digest_id
+
+        return self.submit(insert).result()
+
+    def promote(self, row_id, level, period_start, period_end):
+        """
+        Makes a lone row its period's level-`level` entry, in place: no digest repeats
+        its text, so it is stored (and recalled) once. Its kind stays, so recall still
+        labels it by what it is (a summary, a daily digest). Fails if the row moved meanwhile.
+        """
+        def update(cursor):
+            cursor.execute(SQL_PROMOTE, (level, period_start, period_end, row_id, level - 1))
+            if cursor.rowcount != 1:
+                raise RuntimeError("Consolidation source changed underneath the promotion.")
+
+        return self.submit(update).result()
+
+    # --- TIER 2 VECTOR INDEX SUPPORT ---
+
+    def unembedded_rows(self, signature, limit):
+        """[(id, content, timestamp, level, session_id, is_archived)] not yet embedded under signature."""
+        return self._read(SQL_UNEMBEDDED, (signature, limit))
+
+    def mark_embedded(self, ids, signature):
+        ids = list(ids)
+        return self.submit(lambda cursor: cursor.executemany(
+            "UPDATE session_summaries SET embedded_sig = ? WHERE id = ?", [(signature, i) for i in ids]
+        ).rowcount).result()
+
+    def consolidate_logs(self, session_id=None):
+        """FR-04: Rolls completed days/weeks/months of this scope into digests (see modules.consolidator)."""
+        from modules.consolidator import consolidate
+        return consolidate(self, session_id)
+
+# --- MODULE-LEVEL LEDGER (shared by main, the prune threads and the tools) ---
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger():
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = Ledger()
+    return _ledger
+
+def close_ledger():
+    """Flushes the write queue and closes all pooled connections."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is not None:
+            _ledger.close()
+            _ledger = None
+
+def initialize_ledger():
+    get_ledger().initialize()
+
+def save_summary(content, session_id=None):
+    saved = get_ledger().save_summary(content, session_id=session_id)
+    _notify_vector_index()
+    return saved
+
+def save_summaries(contents, session_id=None):
+    saved = get_ledger().save_summaries(contents, session_id=session_id)
+    _notify_vector_index()
+    return saved
+
+def recall_memory(query_text, recency_weight=RECENCY_WEIGHT, session_id=None):
+    from modules.tier2_vectors import search_summaries
+    vector_hits = search_summaries(query_text, session_id) if query_text.strip() else None
+    return get_ledger().recall_memory(query_text, recency_weight, session_id=session_id, vector_hits=vector_hits)
+
+def recall_relevant(query_text, session_id=None, max_distance=None):
     """
-    FR-16 Update: Returns a dictionary containing the latest timestamp 
-    as a float and the combined content for Conflict Orchestration.
+    Automatic (per-turn) recall: answers only when the Tier 2 vector index has a
+    summary within max_distance (default: FR-03's vault gate), since keyword matches
+    alone fire on almost any message. None while the index is off or nothing is close.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    search_pattern = f"%{query_text}%"
-    
-    # Ordering by timestamp DESC still works perfectly with floats
-    cursor.execute('''
-        SELECT content, timestamp FROM session_summaries 
-        WHERE content LIKE ? AND is_archived = 0 
-        ORDER BY timestamp DESC
-    ''', (search_pattern,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-
-    if not rows:
+    from modules.tier2_vectors import search_summaries
+    if max_distance is None:
+        from modules.vault_engine import DISTANCE_GATE
+        max_distance = DISTANCE_GATE
+    vector_hits = search_summaries(query_text, session_id, max_distance=max_distance)
+    if not vector_hits:
         return None
+    return get_ledger().recall_memory(query_text, session_id=session_id, vector_hits=vector_hits)
 
-    # latest_timestamp will now be a float
-    latest_timestamp = rows[0][1]
-    compiled_content = ""
-    
-    for content, ts in rows:
-        # Convert back to readable string only for the prompt injection
-        readable_ts = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
-        entry = f"\n[{readable_ts}] {content}"
-        
-        # FR-14: Respect the 800-token limit
-        if count_tokens(compiled_content + entry) > 800:
-            break
-        compiled_content += entry
-        
-    return {
-        "content": compiled_content.strip(),
-        "timestamp": latest_timestamp, # Returning the float
-        "source": "Tier 2 (Episodic)"
-    }
-
-def consolidate_logs():
-    """FR-04: Archives old logs after 7 sessions to prevent T2 bloat."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM session_summaries WHERE is_archived = 0")
-    if cursor.fetchone()[0] >= 7:
-        cursor.execute("UPDATE session_summaries SET is_archived = 1 WHERE is_archived = 0")
-        conn.commit()
-        print("[*] Tier 2 Consolidation: 7 sessions archived.")
-    conn.close()
\ No newline at end of file
+def _notify_vector_index():
+    from modules.tier2_vectors import notify_summary_index
+    notify_summary_index()
+
+def consolidate_logs(session_id=None):
+    return get_ledger().consolidate_logs(session_id)
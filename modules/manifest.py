@@ -0,0 +1,77 @@
+import json
+import os
+import sqlite3
+import time
+
+MANIFEST_PATH = os.path.join("data", "ingest_manifest.db")
+
+def manifest_path_for(signature):
+    """Each embedding backend's collection is ingested separately (see embedding_backends)."""
+    if signature == "torch":
+        return MANIFEST_PATH
+    return os.path.join("data", f"ingest_manifest__{signature}.db")
+
+class IngestManifest:
+    """
+    FR-13: Record of what each docs file looked like when it was last ingested.
+    (path, size, mtime, hash, chunk ids) lets /ingest skip unchanged files on a
+    stat() alone and tells it exactly which vectors to drop when a file changes.
+    """
+
+    def __init__(self, db_path=MANIFEST_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256_hash TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                ingested_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def entries(self, directory):
+        """Returns {path: {size, mtime_ns, hash, chunk_ids}} for files recorded under directory."""
+        prefix = os.path.join(os.path.abspath(directory), "")
+        rows = self.conn.execute(
+            "SELECT path, size, mtime_ns, sha256_hash, chunk_ids FROM ingested_files WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix)
+        ).fetchall()
+        return {
+            path: {"size": size, "mtime_ns": mtime_ns, "hash": file_hash, "chunk_ids": json.loads(chunk_ids)}
+            for path, size, mtime_ns, file_hash, chunk_ids in rows
+        }
+
+    def referenced_ids(self, exclude_paths=()):
+        """Every chunk id still owned by some file (identical files share vectors)."""
+        exclude = set(exclude_paths)
+        owned = set()
+        for path, chunk_ids in self.conn.execute("SELECT path, chunk_ids FROM ingested_files"):
+            if path not in exclude:
+                owned.update(json.loads(chunk_ids))
+        return owned
+
+    def record(self, entries):
+        """Upserts [(path, size, mtime_ns, hash, chunk_ids)]."""
+        now = time.time()
+        self.conn.executemany('''
+            INSERT INTO ingested_files (path, size, mtime_ns, sha256_hash, chunk_ids, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size, mtime_ns = excluded.mtime_ns, sha256_hash = excluded.sha256_hash,
+                chunk_ids = excluded.chunk_ids, ingested_at = excluded.ingested_at
+        ''', [(path, size, mtime_ns, file_hash, json.dumps(chunk_ids), now)
+              for path, size, mtime_ns, file_hash, chunk_ids in entries])
+        self.conn.commit()
+
+    def forget(self, paths):
+        self.conn.executemany("DELETE FROM ingested_files WHERE path = ?", [(p,) for p in paths])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,155 @@
+import itertools
+import threading
+import time
+import ollama
+from modules import telemetry
+
+MISSING_RETRY_AFTER = 300     # Seconds before a model that 404'd (not pulled) is tried again
+RESIDENCY_TTL = 15            # Seconds an /api/ps answer is trusted
+
+class ModelRouter:
+    """
+    Sends each kind of LLM work to its own model: interactive chat to the main
+    model, background Tier 2 summaries / digests / reflections to a smaller one,
+    so archiving costs less of the machine while a foreground turn is running.
+
+    Every role has a fallback chain (its own model, then the other). A model that
+    isn't pulled is skipped for a while. A background role whose model is not
+    resident borrows the already-loaded chat model for that job and warms its
+    own model in the background, instead of stalling on a cold load.
+    Ollama must be allowed to hold both (OLLAMA_MAX_LOADED_MODELS >= 2).
+    """
+
+    def __init__(self, get_client, models, keep_alive, foreground_role="chat"):
+        self.get_client = get_client       # Callable: inference.set_client may swap the client
+        self.models = dict(models)         # role -> model
+        self.keep_alive = dict(keep_alive) # role -> Ollama keep_alive
+        self.foreground_role = foreground_role
+        self._missing = {}                 # model -> time it 404'd
+        self._resident = (0.0, None)       # (checked_at, set of model names or None if unknown)
+        self._warming = set()
+        self._lock = threading.Lock()
+
+    # --- MODEL STATE ---
+
+    def chain(self, role):
+        """Models to try for role, preferred first."""
+        ordered = [self.models[role]] + [m for r, m in self.models.items() if r != role]
+        return list(dict.fromkeys(ordered))
+
+    def _is_missing(self, model):
+        with self._lock:
+            failed_at = self._missing.get(model)
+            if failed_at is not None and time.time() - failed_at > MISSING_RETRY_AFTER:
+                del self._missing[model]
+                return False
+            return failed_at is not None
+
+    def mark_missing(self, model):
+        with self._lock:
+            self._missing[model] = time.time()
+        print(f"\n[!] Model Router: '{model}' is not available; falling back.")
+
+    def resident_models(self):
+        """Names of the models Ollama currently holds in memory (None if it can't tell)."""
+        checked_at, resident = self._resident
+        if time.time() - checked_at < RESIDENCY_TTL:
+            return resident
+        try:
+            resident = set()
+            for entry in self.get_client().ps()["models"]:
+                name = entry.get("model") or entry.get("name") or ""
+                resident.update((name, name.split(":")[0]))  # 'llama3.2:latest' also answers 'llama3.2'
+        except Exception:
+            resident = None   # Old server or a stub: assume whatever we ask for is loaded
+        self._resident = (time.time(), resident)
+        return resident
+
+    def resolve(self, role, borrow=True):
+        """The model this role's next request should use (borrow: allow a resident stand-in)."""
+        candidates = [m for m in self.chain(role) if not self._is_missing(m)] or self.chain(role)
+        preferred = candidates[0]
+        if borrow and role != self.foreground_role and len(candidates) > 1:
+            resident = self.resident_models()
+            if resident is not None and preferred not in resident and candidates[1] in resident:
+                self.warm_async(role)
+                telemetry.count("router.borrowed")
+                return candidates[1]
+        return preferred
+
+    def keep_alive_for(self, model):
+        # A borrowed model keeps its owner's keep_alive so it isn't unloaded early
+        for role, owned in self.models.items():
+            if owned == model:
+                return self.keep_alive[role]
+        return self.keep_alive[self.foreground_role]
+
+    # --- CALLS ---
+
+    def call(self, role, request, borrow=True):
+        """
+        Runs request(model, keep_alive) on the role's model, moving down the fallback
+        chain when a model isn't pulled (404). Returns the request's result.
+        """
+        model = self.resolve(role, borrow)
+        while True:
+            try:
+                return request(model, self.keep_alive_for(model))
+            except ollama.ResponseError as e:
+                if e.status_code != 404:
+                    raise
+                self.mark_missing(model)
+                remaining = [m for m in self.chain(role) if not self._is_missing(m)]
+                if not remaining:
+                    raise
+                model = remaining[0]
+                telemetry.count("router.fallback")
+
+    def call_stream(self, role, open_stream):
+        """call() for streaming requests: the first chunk is read here, so a missing model still falls back."""
+        def primed(model, keep_alive):
+            stream = iter(open_stream(model, keep_alive))
+            first = next(stream, None)
+            return model, stream if first is None else itertools.chain([first], stream)
+        return self.call(role, primed)
+
+    # --- WARM-UP ---
+
+    def warm(self, role):
+        """FR-01: Loads role's model with its keep_alive. Returns the model that answered."""
+        def load(model, keep_alive):
+            self.get_client().generate(model=model, prompt='', keep_alive=keep_alive, options={"num_predict": 1})
+            return model
+        model = self.call(role, load, borrow=False)
+        self._resident = (0.0, None)   # Re-check residency on the next resolve
+        return model
+
+    def warm_async(self, role):
+        """Warms role's model on a daemon thread (once at a time), after any foreground turn."""
+        with self._lock:
+            if role in self._warming:
+                return
+            self._warming.add(role)
+
+        def run():
+            from modules.inference import wait_for_foreground_idle
+            try:
+                wait_for_foreground_idle()
+                model = self.warm(role)
+                print(f"\n[*] Model Router: '{model}' warmed for {role}.")
+            except Exception as e:
+                print(f"\n[!] Model Router: warm-up for {role} failed: {e}")
+            finally:
+                with self._lock:
+                    self._warming.discard(role)
+
+        threading.Thread(target=run, name=f"warm-{role}", daemon=True).start()
+
+    def status(self):
+        resident = self.resident_models()
+        return {
+            role: {"model": model, "keep_alive": self.keep_alive[role],
+                   "resident": None if resident is None else model in resident,
+                   "missing": self._is_missing(model)}
+            for role, model in self.models.items()
+        }
@@ -0,0 +1,436 @@
+import asyncio
+import inspect
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from modules.admission import LLM_SLOTS
+from modules.inference import (PROMPT_MODE, CHAT_RULES, build_messages, build_prompt, chat_inference,
+                               stream_chat, stream_inference, foreground_request)
+from modules.context_packer import (MAX_PROMPT_TOKENS, PROMPT_TOKEN_BUDGET, PRIORITY_HISTORY, PRIORITY_T2, PRIORITY_T3,
+                                    Segment, pack_segments, dropped_report)
+from modules.identity import current_time
+from modules.ledger_mgr import recall_memory, recall_relevant, save_summary
+from modules.vault_engine import query_vault, normalize_query, vault_ready
+from modules.summarizer import get_scheduler
+from modules.telemetry import count, span, traced
+from modules.history import RollingHistory
+
+# FR-14: Define the Elastic Parameters
+BASE_T1_LIMIT = 2048
+CONTEXT_RESERVE = 800
+
+PREFETCH_SLOTS = 4            # Speculative lookups kept per session
+SPECULATIVE_PREFETCH = os.environ.get("NEXUS_PREFETCH", "1") == "1"
+# Automatic per-turn retrieval (instead of pinning context with /recall and /vault)
+AUTO_RETRIEVAL = os.environ.get("NEXUS_AUTO_RETRIEVAL", "1") == "1"
+AUTO_RETRIEVAL_WAIT = 0.3     # Seconds a turn waits for its lookups; late results serve the next turn
+TOPIC_OVERLAP = 0.5           # Share of a message's terms already in the cached topic to reuse its lookups
+FOLLOW_UP_TERMS = 1           # Messages with this few content words ("thanks", "why?") stay on topic
+RETRIEVAL_WORKERS = 2         # Own threads: a slow vault search never holds up guard, pack or generation
+LOOKUP_SMOOTHING = 0.3        # Weight of the newest duration in each tier's running lookup time
+ORCHESTRATOR_WORKERS = 4      # Threads for tokenizer / SQLite / embedding calls
+LLM_THREAD_HEADROOM = 1       # Generation threads beyond the LLM slots (a cancelled reply may still be draining)
+
+FLAT_PROMPT_TEMPLATE = """
+{injected_str}
+
+### INSTRUCTIONS ###
+You are ALFRED. Use the [TIER 3] or [TIER 2] data above as your absolute source of truth.
+If data conflicts, prioritize the entry specifically flagged in the SYSTEM warning.
+
+### HISTORY ###
+{history_str}
+"""
+
+def prune_tier_1(history, session_id=None):
+    """
+    FR-07: Async Context Pruning logic.
+    Moves oldest 25% of a RollingHistory to Tier 2 via the bounded background summarizer.
+    Returns the archived lines.
+    """
+    archived = history.drop_oldest_quarter()
+    get_scheduler().submit(archived, session_id=session_id)
+    return archived
+
+def topic_terms(text):
+    """Content words (longer than 3 letters) used to tell whether a message stays on topic."""
+    return frozenset(w for w in re.findall(r"\w+", text.lower()) if len(w) > 3)
+
+class SessionState:
+    """
+    Everything one conversation owns (formerly locals of main.start_system).
+    session_id scopes its Tier 2 rows; None is the local REPL.
+    """
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id
+        self.history = RollingHistory() # FR-14: Tier 1 turns with their token counts
+        # State management for FR-16 Orchestration
+        self.t2_context = None # Stores {content, timestamp, source}
+        self.t3_context = None # Stores {content, timestamp, source}
+        self.last_user_input = None
+        self.prefetched = {}   # (tier, normalised query) -> asyncio.Task
+        self.topic = None      # Automatic retrieval: {"terms", "tasks": {tier: asyncio.Future}}
+        self.t3_lookup = None  # The automatic vault search still on a thread (at most one per session)
+
+class NexusOrchestrator:
+    """
+    Asyncio core of the Nexus loop, independent of input().
+    Blocking work (tokenizer, SQLite, WordNet + embedding + HNSW) runs on a thread
+    pool so one event loop can serve many SessionState objects at once. Ollama calls,
+    which hold a thread for a whole streamed reply, get their own pool sized from the
+    LLM slots, so they can never starve other sessions' guard / pack work.
+    An optional llm_scheduler (modules.admission) gates every LLM call per session.
+    """
+
+    def __init__(self, persona, prompt_mode=PROMPT_MODE, executor=None, llm_scheduler=None,
+                 speculate=SPECULATIVE_PREFETCH, prompt_budget=PROMPT_TOKEN_BUDGET,
+                 auto_retrieve=AUTO_RETRIEVAL):
+        self.persona = persona
+        self.auto_retrieve = auto_retrieve
+        self.prompt_budget = min(prompt_budget, MAX_PROMPT_TOKENS)
+        self.prompt_mode = prompt_mode
+        self.executor = executor or ThreadPoolExecutor(max_workers=ORCHESTRATOR_WORKERS, thread_name_prefix="nexus")
+        slots = llm_scheduler.slots if llm_scheduler is not None else LLM_SLOTS
+        self.llm_executor = ThreadPoolExecutor(max_workers=slots + LLM_THREAD_HEADROOM, thread_name_prefix="nexus-llm")
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="nexus-retrieval")
+        self.lookup_seconds = {}   # tier -> running average of automatic lookup time
+        self.llm_scheduler = llm_scheduler
+        self.speculate = speculate
+
+    def _llm_slot(self, state, admit=True):
+        if self.llm_scheduler is None:
+            return nullcontext()
+        return self.llm_scheduler.slot(state.session_id, admit=admit)
+
+    async def _offload(self, fn, *args, executor=None):
+        return await asyncio.get_running_loop().run_in_executor(executor or self.executor, fn, *args)
+
+    # --- SPECULATIVE RETRIEVAL ---
+
+    def prefetch(self, state, query, tiers=("t2", "t3")):
+        """
+        Starts Tier 2/3 lookups for `query` in the background (e.g. while an answer
+        streams or the user is typing). A later /recall or /vault for the same query
+        awaits the already-running task instead of starting from scratch.
+        """
+        key_query = normalize_query(query)
+        for tier in tiers:
+            key = (tier, key_query)
+            if key in state.prefetched:
+                continue
+            lookup = partial(recall_memory, session_id=state.session_id) if tier == "t2" else query_vault
+            task = asyncio.ensure_future(self._offload(lookup, key_query))
+            # Speculation may never be consumed; don't let its failure go unobserved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            state.prefetched[key] = task
+        # Bound the per-session cache; drop (and cancel) the oldest speculation
+        while len(state.prefetched) > PREFETCH_SLOTS * len(tiers):
+            oldest = next(iter(state.prefetched))
+            state.prefetched.pop(oldest).cancel()
+
+    async def _lookup(self, state, tier, query):
+        """One-shot: consumes a matching speculative lookup, so repeats see fresh data."""
+        key = (tier, normalize_query(query))
+        if key not in state.prefetched:
+            self.prefetch(state, query, tiers=(tier,))
+        return await state.prefetched.pop(key)
+
+    def _auto_retrieve(self, state, user_input):
+        """
+        Starts the Tier 2/3 lookups for this turn, unless the message stays on the
+        cached topic (or is a short follow-up), in which case that topic's lookups are
+        reused. T2 needs a vector hit and T3 passes the vault's 0.5 gate; both quietly.
+        T3 is skipped while the vault isn't loaded yet (no cold Chroma / model load on
+        the request path) and while this session's previous vault search still runs.
+        Returns (topic, fresh).
+        """
+        terms = topic_terms(user_input)
+        topic = state.topic
+        if topic is not None and (len(terms) <= FOLLOW_UP_TERMS
+                                  or len(terms & topic["terms"]) >= TOPIC_OVERLAP * len(terms)):
+            return topic, False
+        self._drop_topic(state)
+        query = normalize_query(user_input)
+        lookups = {"t2": partial(recall_relevant, session_id=state.session_id)}
+        if state.t3_lookup is not None and not state.t3_lookup.done():
+            count("retrieval.t3_skipped")
+        elif vault_ready():
+            lookups["t3"] = partial(query_vault, verbose=False)
+        tasks = {}
+        for tier, lookup in lookups.items():
+            # cancel() on the asyncio side only un-queues a lookup; a running one finishes on its thread
+            running = self.retrieval_executor.submit(self._timed_lookup, tier, lookup, query)
+            if tier == "t3":
+                state.t3_lookup = running
+            task = asyncio.wrap_future(running)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            tasks[tier] = task
+        state.topic = {"terms": terms, "tasks": tasks}
+        return state.topic, True
+
+    def _timed_lookup(self, tier, lookup, query):
+        started = time.perf_counter()
+        try:
+            return lookup(query)
+        finally:
+            elapsed = time.perf_counter() - started
+            previous = self.lookup_seconds.get(tier, elapsed)
+            self.lookup_seconds[tier] = previous + LOOKUP_SMOOTHING * (elapsed - previous)
+
+    async def _retrieved(self, topic):
+        """
+        Waits up to AUTO_RETRIEVAL_WAIT for the topic's lookups, except for tiers whose
+        lookups usually take longer than that. Returns {tier: context or None}.
+        """
+        pending = [task for tier, task in topic["tasks"].items()
+                   if not task.done() and self.lookup_seconds.get(tier, 0.0) <= AUTO_RETRIEVAL_WAIT]
+        if pending:
+            await asyncio.wait(pending, timeout=AUTO_RETRIEVAL_WAIT)
+        return {tier: task.result() if task.done() and not task.cancelled() and task.exception() is None else None
+                for tier, task in topic["tasks"].items()}
+
+    def _drop_topic(self, state):
+        if state.topic is not None:
+            for task in state.topic["tasks"].values():
+                task.cancel()
+            state.topic = None
+
+    # --- ENTRY POINT ---
+
+    async def handle(self, state, user_input, on_token=None):
+        """
+        Processes one line of user input for `state`.
+        Returns {"type": "command" | "reply", "response", "stats", "notices"}.
+        on_token (sync or async) receives reply pieces as they stream.
+        """
+        lowered = user_input.lower()
+        if lowered == "/clear" or lowered.startswith(("/recall", "/vault")):
+            return await self._command(state, user_input)
+        return await self._turn(state, user_input, on_token)
+
+    async def _command(self, state, user_input):
+        notices = []
+        if user_input.lower() == "/clear":
+            state.t2_context = None
+            state.t3_context = None
+            self._drop_topic(state)
+            notices.append("[*] Context cleared. Tier 1 budget expanded.")
+
+        elif user_input.startswith("/recall"):
+            query = user_input.replace("/recall", "").strip()
+            state.t2_context = await self._lookup(state, "t2", query)
+            if state.t2_context:
+                # Note: t2_context['timestamp'] is now a float
+                notices.append("[*] Tier 2 Context Injected.")
+
+        elif user_input.startswith("/vault"):
+            # A bare /vault searches for the last message (usually prefetched already)
+            query = user_input.replace("/vault", "").strip() or state.last_user_input or ""
+            notices.append("[*] Performing CPU-Bound Semantic Search...")
+            state.t3_context = await self._lookup(state, "t3", query)
+            if state.t3_context:
+                notices.append("[*] Tier 3 Context Injected.")
+            else:
+                notices.append("ALFRED: No relevant vault data found.")
+                state.t3_context = None
+
+        return {"type": "command", "response": None, "stats": {}, "notices": notices}
+
+    # --- NEXUS LOOP ---
+
+    async def _turn(self, state, user_input, on_token):
+        with span("turn.total"):
+            return await self._traced_turn(state, user_input, on_token)
+
+    async def _traced_turn(self, state, user_input, on_token):
+        notices = []
+        # Lookups run on the pool while the guard (and its tokenizer work) runs
+        retrieval = self._auto_retrieve(state, user_input) if self.auto_retrieve else None
+        pruned = await self._offload(self._elastic_guard, state)
+        if pruned:
+            notices.append("[*] Elasticity Triggered: Shrinking history to accommodate context...")
+        auto = {}
+        if retrieval is not None:
+            topic, fresh = retrieval
+            auto = await self._retrieved(topic)
+            found = [name for tier, name in (("t2", "Tier 2"), ("t3", "Tier 3"))
+                     if auto.get(tier) and not getattr(state, f"{tier}_context")]
+            if fresh and found:
+                notices.append(f"[*] Auto-retrieval: {' + '.join(found)} context injected.")
+        n_history, injected_str, packed = await self._offload(self._pack, state, user_input, auto)
+        report = dropped_report(packed)
+        if report:
+            notices.append(report)
+
+        # Speculate on this message's topic while Ollama generates the answer
+        # (automatic retrieval has already looked it up)
+        if self.speculate and not self.auto_retrieve:
+            self.prefetch(state, user_input, tiers=("t3",))
+        with span("turn.llm_wait_and_generate"):
+            async with self._llm_slot(state):
+                response, stats = await self._generate(state, n_history, user_input, injected_str, on_token)
+        stats["prompt_tokens"] = packed["used"]
+
+        state.history.append(f"User: {user_input}")
+        state.history.append(f"ALFRED: {response}")
+        state.last_user_input = user_input
+        return {"type": "reply", "response": response, "stats": stats, "notices": notices}
+
+    @traced("turn.elastic_guard")
+    def _elastic_guard(self, state):
+        """STEP 4.1 & 4.2: THE ELASTIC GUARD (FR-14 dynamic budget). Returns True if pruned."""
+        has_active_context = state.t2_context or state.t3_context
+        current_t1_threshold = BASE_T1_LIMIT + (0 if has_active_context else CONTEXT_RESERVE)
+        if state.history.total <= current_t1_threshold:
+            return False
+        prune_tier_1(state.history, session_id=state.session_id)
+        return True
+
+    @traced("turn.pack")
+    def _pack(self, state, user_input, auto=None):
+        """
+        Builds every candidate segment for this turn and packs them into the prompt
+        budget (modules.context_packer). Context pinned with /recall or /vault wins
+        over `auto` (this turn's automatic retrieval). Returns (n_history, injected_str, packed):
+        the packer keeps history as a suffix, so the newest n_history turns go in.
+        """
+        auto = auto or {}
+        t2_context = state.t2_context or auto.get("t2")
+        t3_context = state.t3_context or auto.get("t3")
+        persona, framing = self._framing(t2_context, t3_context)
+        # Only chat mode sends the time (with the volatile context)
+        stamped = f"Current Time: {current_time()}\n{user_input}" if self.prompt_mode == "chat" else user_input
+        segments = [
+            Segment("persona", persona, required=True),
+            Segment("input", stamped, required=True),
+            Segment("framing", framing, required=True),
+        ]
+        if t2_context:
+            for rank, entry in enumerate(t2_context.get("entries") or [t2_context["content"]]):
+                segments.append(Segment("t2", entry, PRIORITY_T2 - rank, position=1000 + rank))
+        if t3_context:
+            for rank, passage in enumerate(t3_context.get("passages") or [t3_context["content"]]):
+                segments.append(Segment("t3", passage, PRIORITY_T3 - rank, position=2000 + rank))
+        newest = len(state.history) - 1
+        for i, (text, tokens) in enumerate(state.history.turns()):
+            segments.append(Segment("history", text, PRIORITY_HISTORY - (newest - i), tokens=tokens,
+                                    chain="history", position=3000 + i))
+
+        packed = pack_segments(segments, self.prompt_budget)
+        kept = packed["kept"]
+        # A tier whose entries were all dropped counts as absent (no stale FR-16 warning)
+        injected_str = self._inject(t2_context if kept.get("t2") else None,
+                                    t3_context if kept.get("t3") else None,
+                                    kept.get("t2"), kept.get("t3"))
+        return len(kept.get("history", [])), injected_str, packed
+
+    def _framing(self, t2_context, t3_context):
+        """
+        (persona, framing) texts as this prompt mode sends them: framing is the tier
+        headers, the FR-16 warning and the mode's own scaffolding, without the data.
+        """
+        scaffold = self._inject(t2_context, t3_context, [""], [""])
+        if self.prompt_mode == "chat":
+            # CHAT_RULES ride in the system message; the final user turn wraps the volatile context
+            final_turn = build_messages("", [], scaffold, "", history_messages=[])[-1]["content"]
+            return f"{self.persona}\n{CHAT_RULES}", final_turn
+        return self.persona, build_prompt("", FLAT_PROMPT_TEMPLATE.format(injected_str=scaffold, history_str=""), "")
+
+    def _inject(self, t2_context, t3_context, t2_entries=None, t3_entries=None):
+        """STEP 4.3: CONFLICT ORCHESTRATOR (FR-16). Entries default to each context's content."""
+        warning_block = ""
+        injected_str = "No external documents loaded."
+
+        if t2_context and t3_context:
+            # UPDATED: Now both are floats, so this is a clean numerical comparison
+            if t3_context['timestamp'] > t2_context['timestamp']:
+                warning_block = "\n[!] SYSTEM: Vault data is more recent. Prioritizing Tier 3.\n"
+            else:
+                warning_block = "\n[!] SYSTEM: Session logs are more recent. Prioritizing Tier 2.\n"
+
+        if t2_context or t3_context:
+            content_2 = "\n".join(t2_entries or [t2_context['content']]) if t2_context else "None"
+            content_3 = "\n\n".join(t3_entries or [t3_context['content']]) if t3_context else "None"
+            injected_str = f"{warning_block}\n[TIER 2]: {content_2}\n\n[TIER 3]: {content_3}"
+        return injected_str
+
+    async def _generate(self, state, n_history, user_input, injected_str, on_token):
+        """
+        Runs the blocking Ollama stream on a worker thread and relays pieces to the loop.
+        If relaying fails (on_token raised, the turn was cancelled) the thread is told to
+        stop, closes the stream and is awaited, so no generation outlives its turn.
+        """
+        loop = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+        stop = threading.Event()
+        stats = {}
+
+        if self.prompt_mode == "chat":
+            # Stable prefix (persona + past turns) first, volatile data last: Ollama reuses its KV cache
+            volatile = f"Current Time: {current_time()}\n{injected_str}"
+            # The clock changes every minute; the cache keys on the retrieved context only
+            stream = stream_chat(self.persona, None, volatile, user_input, stats=stats,
+                                 history_str=state.history.render(n_history),
+                                 history_messages=state.history.messages(n_history),
+                                 cache_volatile=injected_str)
+        else:
+            prompt_context = FLAT_PROMPT_TEMPLATE.format(injected_str=injected_str,
+                                                         history_str=state.history.render(n_history))
+            stream = stream_inference(self.persona, prompt_context, user_input, stats=stats)
+
+        def produce():
+            try:
+                with foreground_request():
+                    while not stop.is_set():
+                        try:
+                            piece = next(stream)
+                        except StopIteration as done:
+                            return done.value
+                        loop.call_soon_threadsafe(pieces.put_nowait, piece)
+                    stream.close()  # Ends the Ollama request instead of generating unread tokens
+            finally:
+                loop.call_soon_threadsafe(pieces.put_nowait, None)
+
+        producer = loop.run_in_executor(self.llm_executor, produce)
+        try:
+            while (piece := await pieces.get()) is not None:
+                if on_token is not None:
+                    result = on_token(piece)
+                    if inspect.isawaitable(result):
+                        await result
+        except BaseException:
+            stop.set()
+            await asyncio.gather(producer, return_exceptions=True)
+            raise
+        return await producer, stats
+
+    # --- SESSION LIFECYCLE ---
+
+    async def end_session(self, state):
+        """FR-09: Archives the session reflection to Tier 2. Returns the summary (or None)."""
+        for task in state.prefetched.values():
+            task.cancel()
+        state.prefetched.clear()
+        self._drop_topic(state)
+        if not state.history:
+            return None
+        full_history_str = state.history.render()
+        reflection_prompt = "Summarize the key technical facts and preferences from this session."
+        async with self._llm_slot(state, admit=False):
+            summary_text = await self._offload(partial(
+                chat_inference, self.persona, "", f"History:\n{full_history_str}\n\nTask: {reflection_prompt}",
+                use_cache=False, role="summarize"
+            ), executor=self.llm_executor)
+        await self._offload(partial(save_summary, summary_text, session_id=state.session_id))
+        return summary_text
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.llm_executor.shutdown(wait=True)
+        # Automatic lookups are disposable: don't wait out a slow vault search
+        self.retrieval_executor.shutdown(wait=False, cancel_futures=True)
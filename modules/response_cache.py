@@ -0,0 +1,189 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+CACHE_PATH = os.path.join("data", "response_cache.db")
+PROFILE_PATH = os.path.join("data", "user_profile.json")
+
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_ENTRIES = 2000       # LRU eviction beyond this
+SEMANTIC_THRESHOLD = 0.95      # Cosine similarity for a near-identical question to count as a hit
+SEMANTIC_CACHE = os.environ.get("NEXUS_SEMANTIC_CACHE") == "1"
+
+def _sha256(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class ResponseCache:
+    """
+    Persistent cache in front of chat_inference.
+    Tier 1 is an exact hash of (model, persona, context, user input, options).
+    Tier 2 (optional) matches a near-identical user input under the exact same
+    persona + context + options by embedding similarity.
+    Entries expire after CACHE_TTL_SECONDS, the least recently used are evicted past
+    CACHE_MAX_ENTRIES, and everything is dropped when the user profile or the vault changes.
+    """
+
+    def __init__(self, db_path=CACHE_PATH, profile_path=PROFILE_PATH, semantic=SEMANTIC_CACHE,
+                 ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, embed_fn=None):
+        self.profile_path = profile_path
+        self.semantic = semantic
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                context_key TEXT NOT NULL,
+                response TEXT NOT NULL,
+                embedding BLOB,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_context ON responses(context_key)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self._profile_stamp = self._read_meta("profile_stamp")
+
+    # --- INVALIDATION ---
+
+    def _read_meta(self, name):
+        row = self.conn.execute("SELECT value FROM cache_meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _profile_fingerprint(self):
+        try:
+            st = os.stat(self.profile_path)
+            return f"{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            return "missing"
+
+    def _check_profile(self):
+        """Drops the cache if data/user_profile.json changed since the entries were written."""
+        stamp = self._profile_fingerprint()
+        if stamp != self._profile_stamp:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.execute("INSERT OR REPLACE INTO cache_meta (name, value) VALUES ('profile_stamp', ?)", (stamp,))
+            self.conn.commit()
+            self._profile_stamp = stamp
+
+    def invalidate(self, reason="vault changed"):
+        """Drops every cached response (e.g. after Tier 3 ingestion)."""
+        with self._lock:
+            removed = self.conn.execute("DELETE FROM responses").rowcount
+            self.conn.commit()
+        if removed:
+            print(f"[*] Response cache cleared ({reason}): {removed} entries.")
+
+    # --- LOOKUP / STORE ---
+
+    @staticmethod
+    def keys(model, persona, context, user_input, options):
+        context_key = _sha256({"model": model, "persona": persona, "context": context, "options": options})
+        return _sha256({"context": context_key, "user": user_input}), context_key
+
+    def _embed(self, text):
+        if self.embed_fn is None:
+            from modules.vault_engine import embed_query
+            self.embed_fn = embed_query
+        return array("f", self.embed_fn(text))
+
+    def get(self, model, persona, context, user_input, options):
+        key, context_key = self.keys(model, persona, context, user_input, options)
+        now = time.time()
+        with self._lock:
+            self._check_profile()
+            row = self.conn.execute(
+                "SELECT key, response FROM responses WHERE key = ? AND created > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None and self.semantic:
+                row = self._semantic_match(context_key, user_input, now)
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, row[0]))
+            self.conn.commit()
+            self.hits += 1
+            return row[1]
+
+    def _semantic_match(self, context_key, user_input, now):
+        candidates = self.conn.execute(
+            "SELECT key, response, embedding FROM responses WHERE context_key = ? AND created > ? AND embedding IS NOT NULL",
+            (context_key, now - self.ttl)
+        ).fetchall()
+        if not candidates:
+            return None
+        query = self._embed(user_input)
+        best, best_score = None, SEMANTIC_THRESHOLD
+        for key, response, blob in candidates:
+            stored = array("f", blob)
+            if len(stored) != len(query):
+                continue  # Written under another embedding backend / dimension
+            score = _cosine(query, stored)
+            if score >= best_score:
+                best, best_score = (key, response), score
+        return best
+
+    def put(self, model, persona, context, user_input, options, response):
+        if not response:
+            return
+        key, context_key = self.keys(model, persona, context, user_input, options)
+        embedding = self._embed(user_input).tobytes() if self.semantic else None
+        now = time.time()
+        with self._lock:
+            self._check_profile()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, context_key, response, embedding, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, context_key, response, embedding, now, now)
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+        self.conn.execute('''
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "semantic": self.semantic}
+
+# --- MODULE-LEVEL CACHE ---
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def invalidate_cache(reason="vault changed"):
+    """Clears cached responses; safe to call from ingestion workers."""
+    get_cache().invalidate(reason)
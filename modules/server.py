@@ -0,0 +1,209 @@
+import asyncio
+import os
+import time
+import uuid
+from modules.admission import AdmissionError, FairLLMScheduler
+from modules.inference import heartbeat_warmup, get_router, PROMPT_MODE
+from modules.identity import load_identity
+from modules.ledger_mgr import initialize_ledger, consolidate_logs, close_ledger
+from modules.consolidator import start_background_consolidation
+from modules.tier2_vectors import start_summary_indexer, stop_summary_indexer
+from modules.orchestrator import NexusOrchestrator, SessionState
+from modules.summarizer import get_scheduler, shutdown_scheduler
+from modules import telemetry
+
+try:
+    from aiohttp import web, WSMsgType
+except ImportError:  # Server mode is optional; the REPL never needs it
+    web = None
+
+SERVER_HOST = os.environ.get("NEXUS_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("NEXUS_PORT", "8765"))
+MAX_SESSIONS = int(os.environ.get("NEXUS_MAX_SESSIONS", "64"))
+SESSION_IDLE_TIMEOUT = 1800   # Seconds before an abandoned session is archived and dropped
+REAPER_INTERVAL = 60
+SESSION_DRAIN_TIMEOUT = 120   # Seconds an ending session waits for its pruned slices to be archived
+
+class SessionEntry:
+    """A live session: its state plus a lock so its turns never interleave."""
+
+    def __init__(self, state):
+        self.state = state
+        self.lock = asyncio.Lock()
+        self.last_seen = time.time()
+
+class NexusServer:
+    """
+    HTTP/WebSocket front end for one warmed model shared by many sessions.
+    Every session gets its own SessionState (history, T2/T3 context, Tier 2 scope);
+    the orchestrator's FairLLMScheduler rotates LLM calls across them.
+
+        POST   /sessions                  -> {"session_id"}
+        POST   /sessions/{id}/messages    {"text"} -> orchestrator result
+        GET    /sessions/{id}/ws          text frames in, {"token"} ... {"done", ...} out
+        DELETE /sessions/{id}             archives the session (FR-09) and drops it
+        GET    /health                    session count, LLM queue, Tier 2 archiver, model and trace metrics
+    """
+
+    def __init__(self, orchestrator, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT):
+        if web is None:
+            raise RuntimeError("Server mode needs aiohttp (pip install aiohttp).")
+        self.orchestrator = orchestrator
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self._reaper = None
+
+    def build_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/sessions", self.create_session),
+            web.delete("/sessions/{session_id}", self.delete_session),
+            web.post("/sessions/{session_id}/messages", self.post_message),
+            web.get("/sessions/{session_id}/ws", self.websocket),
+            web.get("/health", self.health),
+        ])
+        app.on_startup.append(self._start_reaper)
+        app.on_cleanup.append(self._shutdown)
+        return app
+
+    # --- SESSIONS ---
+
+    def _entry(self, request):
+        entry = self.sessions.get(request.match_info["session_id"])
+        if entry is None:
+            raise web.HTTPNotFound(text="Unknown session.")
+        entry.last_seen = time.time()
+        return entry
+
+    async def _end_session(self, session_id):
+        entry = self.sessions.pop(session_id, None)
+        if entry is None:
+            return None
+        async with entry.lock:
+            # FR-07: The session's in-flight prune summaries must land before consolidation
+            await asyncio.to_thread(get_scheduler().drain_session, session_id, SESSION_DRAIN_TIMEOUT)
+            summary = await self.orchestrator.end_session(entry.state)
+        if summary:
+            await asyncio.to_thread(consolidate_logs, session_id)
+        return summary
+
+    async def _process(self, entry, text, on_token=None):
+        """One turn for one session. A session handles one message at a time."""
+        if entry.lock.locked():
+            raise AdmissionError("This session is still answering the previous message.")
+        async with entry.lock:
+            return await self.orchestrator.handle(entry.state, text, on_token=on_token)
+
+    # --- HANDLERS ---
+
+    async def create_session(self, request):
+        if len(self.sessions) >= self.max_sessions:
+            return web.json_response({"error": "Session limit reached."}, status=503)
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = SessionEntry(SessionState(session_id))
+        return web.json_response({"session_id": session_id}, status=201)
+
+    async def delete_session(self, request):
+        summary = await self._end_session(request.match_info["session_id"])
+        return web.json_response({"archived": bool(summary)})
+
+    async def post_message(self, request):
+        entry = self._entry(request)
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Expected a JSON body.")
+        text = (body.get("text") or "").strip()
+        if not text:
+            raise web.HTTPBadRequest(text="Empty message.")
+        try:
+            return web.json_response(await self._process(entry, text))
+        except AdmissionError as e:
+            return web.json_response({"error": str(e)}, status=429)
+
+    async def websocket(self, request):
+        entry = self._entry(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        async def on_token(piece):
+            await ws.send_json({"token": piece})
+
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            text = message.data.strip()
+            if not text:
+                continue
+            if text.lower() in ["/exit", "/quit"]:
+                summary = await self._end_session(request.match_info["session_id"])
+                await ws.send_json({"done": True, "type": "exit", "archived": bool(summary)})
+                break
+            entry.last_seen = time.time()
+            try:
+                result = await self._process(entry, text, on_token=on_token)
+            except AdmissionError as e:
+                await ws.send_json({"error": str(e)})
+                continue
+            await ws.send_json({"done": True, **result})
+        return ws
+
+    async def health(self, request):
+        llm = self.orchestrator.llm_scheduler
+        return web.json_response({
+            "sessions": len(self.sessions),
+            "llm": llm.metrics() if llm else None,
+            "archiver": get_scheduler().metrics(),
+            "models": await asyncio.to_thread(get_router().status),
+            "trace": telemetry.stage_stats() if telemetry.ENABLED else None,
+        })
+
+    # --- LIFECYCLE ---
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(REAPER_INTERVAL)
+            cutoff = time.time() - self.idle_timeout
+            for session_id, entry in list(self.sessions.items()):
+                if entry.last_seen < cutoff and not entry.lock.locked():
+                    print(f"[*] Session {session_id[:8]} idle; archiving.")
+                    await self._end_session(session_id)
+
+    async def _start_reaper(self, app):
+        self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def _shutdown(self, app):
+        if self._reaper:
+            self._reaper.cancel()
+        # FR-07: In-flight prune summaries must land before the reflections and consolidation
+        await asyncio.to_thread(shutdown_scheduler)
+        for session_id in list(self.sessions):
+            await self._end_session(session_id)
+        stop_summary_indexer()
+        close_ledger()
+        telemetry.flush()
+        self.orchestrator.close()
+
+def run_server(host=SERVER_HOST, port=SERVER_PORT):
+    """Warm-up once, then serve every session from the same model and embedding function."""
+    print("--- NEXUS CORE: SERVER MODE ---")
+    if web is None:
+        print("[!] Server mode needs aiohttp (pip install aiohttp).")
+        return
+
+    if not heartbeat_warmup():
+        print("[!] Failed to warm up inference engine.")
+        return
+    persona, persona_tokens = load_identity(include_time=(PROMPT_MODE != "chat"))
+    initialize_ledger()
+    start_background_consolidation()
+
+    from modules.vault_engine import preload_async
+    preload_async()
+    start_summary_indexer()
+
+    orchestrator = NexusOrchestrator(persona, llm_scheduler=FairLLMScheduler())
+    server = NexusServer(orchestrator)
+    print(f"[*] Serving on http://{host}:{port} (max {server.max_sessions} sessions)")
+    web.run_app(server.build_app(), host=host, port=port, print=None)
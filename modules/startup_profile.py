@@ -0,0 +1,52 @@
+import builtins
+import os
+import sys
+import time
+
+# Enable with NEXUS_STARTUP_REPORT=1 or `python main.py --timings`
+ENABLED = os.environ.get("NEXUS_STARTUP_REPORT") == "1" or "--timings" in sys.argv
+
+_started = time.perf_counter()
+_original_import = builtins.__import__
+_imports = {}     # module name -> (inclusive seconds, self seconds)
+_stack = []       # child time accumulated by the imports currently in progress
+_phases = []      # (label, seconds since process start)
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    started = time.perf_counter()
+    _stack.append(0.0)
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        children = _stack.pop()
+        _imports.setdefault(name, (elapsed, elapsed - children))
+        if _stack:
+            _stack[-1] += elapsed
+
+def install():
+    """Starts recording import times. Call before the heavy imports in main.py."""
+    if ENABLED and builtins.__import__ is not _timed_import:
+        builtins.__import__ = _timed_import
+
+def mark(label):
+    """Records a startup phase boundary (e.g. 'ledger ready')."""
+    if ENABLED:
+        _phases.append((label, time.perf_counter() - _started))
+
+def report(top=15):
+    """Prints import cost per module and the phase timeline, then stops recording."""
+    if not ENABLED:
+        return
+    builtins.__import__ = _original_import
+    print("\n--- STARTUP TIMING REPORT ---")
+    print(f"{'module':<40}{'inclusive':>12}{'self':>10}")
+    for name, (inclusive, own) in sorted(_imports.items(), key=lambda kv: kv[1][0], reverse=True)[:top]:
+        print(f"{name:<40}{inclusive * 1000:>10.1f}ms{own * 1000:>8.1f}ms")
+    previous = 0.0
+    for label, at in _phases:
+        print(f"[phase] {label:<32}+{(at - previous) * 1000:>8.1f}ms  (t={at:.2f}s)")
+        previous = at
+    print("-----------------------------")
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import deque
+from modules.inference import chat_inference, wait_for_foreground_idle
+from modules.ledger_mgr import save_summary
+from modules.telemetry import span
+
+# FR-07 scheduler sizing
+SUMMARY_WORKERS = 1           # One local model: more workers only fight over it
+MAX_PENDING_SLICES = 8        # Hard cap on queued entries; beyond it new slices are folded into pending ones
+MAX_BATCH_MESSAGES = 64       # Upper bound on messages coalesced into one LLM call
+SUBMIT_WAIT_SECONDS = 2.0     # Full queue, nothing to fold into: wait this long for room, then drop the oldest
+LAG_WARNING_SECONDS = 120.0
+
+def summarize_messages(messages):
+    """Summarizing for the Ledger (Tier 2)"""
+    content = "\n".join(messages)
+    return chat_inference("System", "Summarize these facts for Tier 2 storage.", content,
+                          use_cache=False, role="summarize")
+
+class SummaryScheduler:
+    """
+    FR-07: Bounded background archiver for pruned Tier 1 slices.
+    A fixed pool of workers pulls from a bounded queue, merges adjacent slices of the
+    same session into one summarization call, and waits for interactive turns to finish first.
+    An entry holds messages per session, so a full queue can fold any session's slice
+    into a pending entry while sessions still never share a summary. Folding stops at
+    MAX_BATCH_MESSAGES per entry; past that submit waits briefly for room and then
+    drops the oldest entry (counted in metrics() as 'dropped').
+    drain() lets /exit flush in-flight summaries before consolidate_logs();
+    drain_session() does the same for one server session.
+    """
+
+    def __init__(self, summarize_fn=summarize_messages, save_fn=save_summary,
+                 workers=SUMMARY_WORKERS, max_pending=MAX_PENDING_SLICES):
+        self.summarize_fn = summarize_fn
+        self.save_fn = save_fn
+        self.max_pending = max_pending
+        self._pending = deque()   # [{session_id: messages}, oldest_submit_time, slice_count]
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._busy_sessions = []  # session_id of every batch part being summarized right now
+        self._stopping = False
+        self._stats = {
+            "submitted": 0, "coalesced": 0, "batches": 0, "failed": 0, "dropped": 0,
+            "messages": 0, "last_latency": 0.0, "max_latency": 0.0, "total_latency": 0.0,
+        }
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"summary-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, messages, session_id=None):
+        """
+        Queues a pruned slice. A full queue coalesces it into a pending entry that stays
+        within MAX_BATCH_MESSAGES; if none has room, blocks up to SUBMIT_WAIT_SECONDS
+        and then drops the oldest entry to make space.
+        """
+        messages = list(messages)
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Summary scheduler is shut down.")
+            self._stats["submitted"] += 1
+            if len(self._pending) >= self.max_pending:
+                # Full queue: fold into this session's newest entry, else the newest entry of all
+                fits = [entry for entry in reversed(self._pending)
+                        if sum(map(len, entry[0].values())) + len(messages) <= MAX_BATCH_MESSAGES]
+                target = next((entry for entry in fits if session_id in entry[0]), fits[0] if fits else None)
+                if target is not None:
+                    target[0].setdefault(session_id, []).extend(messages)
+                    target[2] += 1
+                    self._cond.notify()
+                    return
+                if not self._cond.wait_for(lambda: len(self._pending) < self.max_pending or self._stopping,
+                                           SUBMIT_WAIT_SECONDS):
+                    _, _, slices = self._pending.popleft()
+                    self._stats["dropped"] += slices
+                    print(f"\n[!] FR-07: Tier 2 archiving is behind; dropped {slices} pending slice(s).")
+            self._pending.append([{session_id: messages}, time.time(), 1])
+            self._cond.notify()
+
+    def _take_batch(self):
+        """
+        Pops the oldest entry plus any adjacent single-session ones of the same session
+        that still fit in one call. Returns ([(session_id, messages)], submitted_at).
+        """
+        parts, submitted_at, slices = self._pending.popleft()
+        if len(parts) == 1:
+            (session_id, messages), = parts.items()
+            while (self._pending and list(self._pending[0][0]) == [session_id]
+                   and len(messages) + len(self._pending[0][0][session_id]) <= MAX_BATCH_MESSAGES):
+                extra, _, extra_slices = self._pending.popleft()
+                messages.extend(extra[session_id])
+                slices += extra_slices
+        # Every slice beyond one per session rode along in someone else's LLM call
+        self._stats["coalesced"] += slices - len(parts)
+        return list(parts.items()), submitted_at
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                batches, submitted_at = self._take_batch()
+                self._in_flight += 1
+                self._busy_sessions.extend(session_id for session_id, _ in batches)
+                self._cond.notify_all()  # Room for a blocked submit
+
+            results = []
+            for session_id, messages in batches:
+                try:
+                    # Interactive generation owns the model; archive in the gaps
+                    wait_for_foreground_idle()
+                    with span("summarizer.batch"):
+                        self.save_fn(self.summarize_fn(messages), session_id=session_id)
+                    results.append((len(messages), time.time() - submitted_at))
+                    print(f"\n[*] FR-07: {len(messages)} messages archived to Tier 2.")
+                except Exception as e:
+                    results.append((len(messages), None))
+                    print(f"\n[!] FR-07: Tier 2 archiving failed for {len(messages)} messages: {e}")
+
+            with self._cond:
+                self._in_flight -= 1
+                for session_id, _ in batches:
+                    self._busy_sessions.remove(session_id)
+                for n_messages, latency in results:
+                    if latency is None:
+                        self._stats["failed"] += 1
+                    else:
+                        self._stats["batches"] += 1
+                        self._stats["messages"] += n_messages
+                        self._stats["last_latency"] = latency
+                        self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+                        self._stats["total_latency"] += latency
+                self._cond.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits until every queued slice has been summarized and saved."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and self._in_flight == 0, timeout)
+
+    def drain_session(self, session_id, timeout=None):
+        """Waits until one session's queued slices have been summarized and saved."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: session_id not in self._busy_sessions
+                and not any(session_id in entry[0] for entry in self._pending),
+                timeout
+            )
+
+    def shutdown(self, timeout=None):
+        """Drains the queue, then stops the workers."""
+        drained = self.drain(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        return drained
+
+    def metrics(self):
+        """Queue depth and latency snapshot; 'behind' flags archiving that cannot keep up."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["depth"] = len(self._pending)
+            stats["in_flight"] = self._in_flight
+            stats["oldest_wait"] = (time.time() - self._pending[0][1]) if self._pending else 0.0
+        stats["avg_latency"] = stats.pop("total_latency") / stats["batches"] if stats["batches"] else 0.0
+        stats["behind"] = stats["depth"] >= self.max_pending or stats["oldest_wait"] > LAG_WARNING_SECONDS
+        return stats
+
+# --- MODULE-LEVEL SCHEDULER ---
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = SummaryScheduler()
+    return _scheduler
+
+def shutdown_scheduler(timeout=None):
+    """Flushes pending Tier 2 summaries. Safe to call if nothing was ever pruned."""
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        return scheduler.shutdown(timeout)
+    return True
@@ -0,0 +1,130 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Hot-path tracing. Enable with NEXUS_TRACE=1 or `python main.py --trace`.
+# Disabled, span() hands back one shared no-op object and traced() returns the
+# function untouched, so instrumented code pays one global lookup per call.
+ENABLED = os.environ.get("NEXUS_TRACE") == "1" or "--trace" in sys.argv
+
+METRICS_PATH = os.path.join("data", "metrics.jsonl")
+METRICS_MAX_MB = 16           # Rolled over to metrics.jsonl.1 beyond this
+FLUSH_EVERY = 64              # Buffered events per write
+ROLLING_WINDOW = 1024         # Samples per stage kept in memory for /stats
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+        return False
+
+_lock = threading.Lock()
+_samples = {}     # stage -> deque of seconds
+_counters = {}    # name -> int
+_buffer = []      # JSONL events not yet written
+
+def span(name):
+    """`with span("vault.search"):` times the block into stage `name`."""
+    return _Span(name) if ENABLED else _NULL_SPAN
+
+def traced(name):
+    """Decorator form of span(); returns fn itself when tracing is off."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def record(name, seconds):
+    """Adds one duration sample, e.g. the prompt-eval time Ollama reports."""
+    if not ENABLED:
+        return
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=ROLLING_WINDOW)
+        samples.append(seconds)
+        _buffer.append({"t": time.time(), "stage": name, "ms": round(seconds * 1000, 3)})
+        full = len(_buffer) >= FLUSH_EVERY
+    if full:
+        flush()
+
+def count(name, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def flush(path=METRICS_PATH):
+    """Appends buffered events to the JSONL file, rolling it over when too large."""
+    with _lock:
+        events = _buffer[:]
+        del _buffer[:]
+    if not events:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > METRICS_MAX_MB * 1024 * 1024:
+            os.replace(path, path + ".1")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in events))
+    except OSError as e:
+        print(f"[!] Telemetry: could not write {path}: {e}")
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def stage_stats():
+    """{stage: {n, p50_ms, p95_ms, max_ms}} over the rolling window, plus counters."""
+    with _lock:
+        snapshot = {name: sorted(s) for name, s in _samples.items()}
+        counters = dict(_counters)
+    stages = {
+        name: {"n": len(s), "p50_ms": _percentile(s, 0.50) * 1000,
+               "p95_ms": _percentile(s, 0.95) * 1000, "max_ms": s[-1] * 1000}
+        for name, s in snapshot.items() if s
+    }
+    return {"stages": stages, "counters": counters}
+
+def print_stage_stats():
+    """Console table for the /stats command."""
+    if not ENABLED:
+        print("[*] Tracing is off. Start with NEXUS_TRACE=1 (or --trace) to collect stage timings.")
+        return
+    stats = stage_stats()
+    print(f"\n{'stage':<32}{'n':>7}{'p50':>11}{'p95':>11}{'max':>11}")
+    for name, s in sorted(stats["stages"].items()):
+        print(f"{name:<32}{s['n']:>7}{s['p50_ms']:>9.1f}ms{s['p95_ms']:>9.1f}ms{s['max_ms']:>9.1f}ms")
+    if stats["counters"]:
+        print("[*] Counters: " + ", ".join(f"{k}={v}" for k, v in sorted(stats["counters"].items())))
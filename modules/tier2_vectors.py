@@ -0,0 +1,139 @@
+import threading
+from modules.embedding_backends import backend_signature
+from modules.inference import wait_for_foreground_idle
+from modules.ledger_mgr import RECALL_CANDIDATES, get_ledger
+
+# Tier 2 semantic index: every summary and digest is embedded (in batches, on a
+# background thread) into its own Chroma collection, scoped per session.
+TIER2_COLLECTION = "tier2_summaries"
+INDEX_BATCH_SIZE = 64
+INDEX_SWEEP_INTERVAL = 60     # Catch-up sweep even without notifications (e.g. digests, other processes)
+TIER2_DISTANCE_GATE = 0.6     # Looser than FR-03's 0.5: fusion with BM25 filters the rest
+
+def scope_of(session_id):
+    return session_id or "local"
+
+class SummaryIndexer:
+    """
+    Embeds Tier 2 rows off the hot path. save_summary only marks the index dirty;
+    this thread picks up every row whose embedded_sig is not the current backend,
+    embeds a batch with the (cached) Tier 3 embedding function and upserts it.
+    Rows archived into a digest are deleted from the collection instead, and
+    promoted rows are upserted again with their new level.
+    Until the first batch has run, search() returns nothing and recall stays lexical.
+    """
+
+    def __init__(self, ledger=None, signature=None):
+        self.ledger = ledger or get_ledger()
+        self.signature = signature or backend_signature()
+        self.collection = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_collection(self):
+        from modules.vault_engine import get_client, get_embedding_function, vault_collection_name
+        return get_client().get_or_create_collection(
+            name=vault_collection_name(self.signature, base=TIER2_COLLECTION),
+            embedding_function=get_embedding_function(),
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="tier2-indexer", daemon=True)
+        self._thread.start()
+        return self
+
+    def notify(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                if self.collection is None:
+                    self.collection = self._load_collection()
+                self.index_pending()
+            except Exception as e:
+                print(f"\n[!] Tier 2 vector indexing failed: {e}")
+            self._wake.wait(INDEX_SWEEP_INTERVAL)
+
+    def index_pending(self):
+        """Embeds (or drops, once archived) every row not yet indexed under this backend. Returns the number handled."""
+        indexed = 0
+        while not self._stop.is_set():
+            rows = self.ledger.unembedded_rows(self.signature, INDEX_BATCH_SIZE)
+            if not rows:
+                break
+            archived = [str(row[0]) for row in rows if row[5]]
+            active = [row for row in rows if not row[5]]
+            if archived:
+                # Rolled into a digest: recall reaches them through the digest now
+                self.collection.delete(ids=archived)
+            if active:
+                # Embedding shares the CPU with Ollama; let interactive turns finish first
+                wait_for_foreground_idle()
+                self.collection.upsert(
+                    ids=[str(row_id) for row_id, *_ in active],
+                    documents=[content for _, content, *_ in active],
+                    metadatas=[{"scope": scope_of(session_id), "level": level, "timestamp": timestamp}
+                               for _, _, timestamp, level, session_id, _ in active]
+                )
+            self.ledger.mark_embedded([row_id for row_id, *_ in rows], self.signature)
+            indexed += len(rows)
+        return indexed
+
+    def search(self, query_text, session_id=None, n_results=RECALL_CANDIDATES, max_distance=TIER2_DISTANCE_GATE):
+        """Summary ids of session_id's scope, nearest first, within max_distance."""
+        if self.collection is None:
+            return []
+        from modules.vault_engine import embed_query, normalize_query
+        results = self.collection.query(
+            query_embeddings=[list(embed_query(normalize_query(query_text)))],
+            n_results=n_results,
+            where={"scope": scope_of(session_id)}
+        )
+        if not results['ids'] or not results['ids'][0]:
+            return []
+        return [int(doc_id) for doc_id, distance in zip(results['ids'][0], results['distances'][0])
+                if distance <= max_distance]
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+# --- MODULE-LEVEL INDEXER ---
+
+_indexer = None
+_indexer_lock = threading.Lock()
+
+def start_summary_indexer():
+    """Starts the background Tier 2 indexer (once). Recall works lexically without it."""
+    global _indexer
+    with _indexer_lock:
+        if _indexer is None:
+            _indexer = SummaryIndexer().start()
+    return _indexer
+
+def stop_summary_indexer():
+    global _indexer
+    with _indexer_lock:
+        indexer, _indexer = _indexer, None
+    if indexer is not None:
+        indexer.stop()
+
+def notify_summary_index():
+    if _indexer is not None:
+        _indexer.notify()
+
+def search_summaries(query_text, session_id=None, max_distance=TIER2_DISTANCE_GATE):
+    """Vector hits for hybrid recall; [] while the indexer is off or still warming up."""
+    if _indexer is None:
+        return []
+    try:
+        return _indexer.search(query_text, session_id, max_distance=max_distance)
+    except Exception as e:
+        print(f"[!] Tier 2 vector search failed, using keywords only: {e}")
+        return []
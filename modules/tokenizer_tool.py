@@ -1,16 +1,34 @@
+import threading
 import tiktoken
+from modules.telemetry import traced
 
+# FR-12: The encoder is loaded once per process and shared by every caller
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def get_encoding():
+    """
+    Returns the shared 'o200k_base' encoder, loading it on first use.
+    tiktoken.get_encoding() is not free, so the hot path must never call it per-turn.
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+@traced("tokenizer.count_tokens")
 def count_tokens(text: str) -> int:
     """
     FR-12: Precision token counting.
-    Uses 'o200k_base' which is the closest match for the Llama-3 
+    Uses 'o200k_base' which is the closest match for the Llama-3
     tokenization logic in a local Python environment.
     """
     try:
         # o200k_base is the encoding used by the latest Llama/GPT models
-        encoding = tiktoken.get_encoding("o200k_base")
-        return len(encoding.encode(text))
+        return len(get_encoding().encode(text))
     except Exception as e:
         print(f"Tokenizer Error: {e}")
         # Fallback to a rough word-count estimate if library fails
-        return len(text.split()) * 1.3
\ No newline at end of file
+        return len(text.split()) * 1.3
@@ -1,72 +1,362 @@
-import chromadb
-from chromadb.utils import embedding_functions
-from nltk.corpus import wordnet # FR-02 Requirement
-
-# Initialize ChromaDB
-client = chromadb.PersistentClient(path="data/chroma_store")
-cpu_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="mixedbread-ai/mxbai-embed-large-v1",
-    device="cpu"
-)
-
-vault = client.get_or_create_collection(
-    name="semantic_vault", 
-    embedding_function=cpu_ef,
-    metadata={"hnsw:space": "cosine"}
-)
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from modules.chunker import merge_chunks
+from modules.embedding_backends import EMBEDDING_MODEL, backend_signature, load_embedding_function
+from modules.telemetry import count, traced
 
+# Tier 3 retrieval: top-k chunks, stitched and capped before prompt injection
+VAULT_TOP_K = 8
+VAULT_TOKEN_BUDGET = 800
+DISTANCE_GATE = 0.5
+
+# Multi-query retrieval: the query and its expansions are embedded in one batch,
+# searched in one vault.query, and fused by reciprocal rank
+MAX_QUERY_VARIANTS = 4
+RRF_K = 60                    # Standard RRF damping: 1 / (RRF_K + rank)
+
+# Optional CPU cross-encoder pass over the fused candidates (NEXUS_RERANK=1)
+RERANK = os.environ.get("NEXUS_RERANK") == "1"
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 16
+
+CHROMA_PATH = "data/chroma_store"
+VAULT_COLLECTION = "semantic_vault"
+
+# FR-02: WordNet synonym table, filled per word on first use and persisted, + memoised expansion/embedding
+SYNONYM_INDEX_PATH = os.path.join("data", "synonym_index.json")
+SYNONYM_SAVE_EVERY = 32       # Newly looked-up words between writes of the table
+EXPANSION_LIMIT = 5           # Query + up to 4 synonyms
+SYNONYMS_PER_WORD = 8         # Stored per word; extra slack for overlaps between words
+QUERY_CACHE_SIZE = 512
+
+# Lazily initialised: importing this module must not load torch, the model or Chroma.
+# `client`, `cpu_ef` and `vault` remain importable names via __getattr__ below.
+_client = None
+_cpu_ef = None
+_vault = None
+_init_lock = threading.RLock()
+_preload_thread = None
+_synonym_index = None
+_synonym_unsaved = 0
+_reranker = None
+_embedding_cache = OrderedDict()   # query text -> embedding tuple (LRU, QUERY_CACHE_SIZE)
+_embedding_lock = threading.Lock()
+
+def get_client():
+    """Initialize ChromaDB on first use."""
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return _client
+
+def get_embedding_function():
+    """
+    Loads the CPU-pinned embedding model on first use (this is where torch / onnxruntime
+    gets imported). NEXUS_EMBED_BACKEND / _DIM / _BINARY pick the backend.
+    Unless NEXUS_EMBED_CACHE=0, text embedded before (by this model) is read from disk.
+    """
+    global _cpu_ef
+    if _cpu_ef is None:
+        with _init_lock:
+            if _cpu_ef is None:
+                ef = load_embedding_function(EMBEDDING_MODEL)
+                from modules.embedding_cache import EMBEDDING_CACHE, CachedEmbeddingFunction
+                if EMBEDDING_CACHE:
+                    ef = CachedEmbeddingFunction(ef, f"{EMBEDDING_MODEL}|{backend_signature()}")
+                _cpu_ef = ef
+    return _cpu_ef
+
+def vault_collection_name(signature=None, base=VAULT_COLLECTION):
+    """One collection per vector space; the original backend keeps the plain name."""
+    signature = signature or backend_signature()
+    return base if signature == "torch" else f"{base}__{signature}"
+
+def get_vault():
+    global _vault
+    if _vault is None:
+        with _init_lock:
+            if _vault is None:
+                _vault = get_client().get_or_create_collection(
+                    name=vault_collection_name(),
+                    embedding_function=get_embedding_function(),
+                    metadata={"hnsw:space": "cosine"}
+                )
+    return _vault
+
+def vault_ready():
+    """True once Chroma and the embedding model are loaded (by preload_async or a first /vault)."""
+    return _vault is not None
+
+def get_reranker():
+    """Loads the cross-encoder on first use. Returns None if sentence-transformers is missing."""
+    global _reranker
+    if _reranker is None:
+        with _init_lock:
+            if _reranker is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError:
+                    print("[!] Re-ranking needs sentence-transformers; using fused order.")
+                    _reranker = False
+                    return None
+                started = time.perf_counter()
+                _reranker = CrossEncoder(RERANK_MODEL, device="cpu")
+                print(f"\n[*] Tier 3 re-ranker loaded in {time.perf_counter() - started:.1f}s.")
+    return _reranker or None
+
+def preload_async():
+    """
+    Warms Chroma, the embedding model, the synonym table and the WordNet reader on a
+    background thread so the first /vault doesn't pay for them. Safe to call more than once.
+    """
+    global _preload_thread
+    if _preload_thread is None:
+        def preload():
+            try:
+                get_vault()
+                load_synonym_index()
+                warm_wordnet()
+            except Exception as e:
+                print(f"\n[!] Tier 3 preload failed: {e}")
+        _preload_thread = threading.Thread(target=preload, name="vault-preload", daemon=True)
+        _preload_thread.start()
+    return _preload_thread
+
+def __getattr__(name):
+    # Backwards-compatible module attributes (e.g. `from modules.vault_engine import vault`)
+    if name == "client":
+        return get_client()
+    if name == "cpu_ef":
+        return get_embedding_function()
+    if name == "vault":
+        return get_vault()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- FR-02: QUERY EXPANSION ---
+
+def _wordnet_synonyms(word):
+    """Ordered, de-duplicated lemma names across the word's synsets (WordNet order)."""
+    from nltk.corpus import wordnet # FR-02 Requirement
+
+    found = []
+    for syn in wordnet.synsets(word):
+        for lemma in syn.lemmas():
+            clean_syn = lemma.name().replace('_', ' ')
+            if clean_syn not in found:
+                found.append(clean_syn)
+                if len(found) >= SYNONYMS_PER_WORD:
+                    return found
+    return found
+
+def warm_wordnet():
+    """Loads the WordNet corpus reader, which the first live synonym lookup would otherwise pay for."""
+    from nltk.corpus import wordnet # FR-02 Requirement
+    wordnet.ensure_loaded()
+
+def load_synonym_index(path=SYNONYM_INDEX_PATH):
+    """Loads the persisted {word: [synonyms]} table once ({} before any word was looked up)."""
+    global _synonym_index
+    if _synonym_index is None:
+        with _init_lock:
+            if _synonym_index is None:
+                index = {}
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        index = json.load(f)
+                _synonym_index = index
+    return _synonym_index
+
+def save_synonym_index(path=SYNONYM_INDEX_PATH):
+    """Writes the table if words were added since the last save. Returns True if it wrote."""
+    global _synonym_unsaved
+    with _init_lock:
+        if not _synonym_unsaved:
+            return False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(_synonym_index, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        _synonym_unsaved = 0
+    return True
+
+atexit.register(save_synonym_index)
+
+@lru_cache(maxsize=4096)
+def word_synonyms(word):
+    """
+    Table lookup first. A word the table doesn't have gets one live WordNet lookup
+    (which applies morphy, so 'funds' works); the answer, even an empty one, joins
+    the table and is persisted, so no word is looked up in the corpus twice.
+    """
+    global _synonym_unsaved
+    key = word.lower()
+    index = load_synonym_index()
+    if key in index:
+        return tuple(index[key])
+    synonyms = _wordnet_synonyms(word)
+    with _init_lock:
+        index[key] = synonyms
+        _synonym_unsaved += 1
+        due = _synonym_unsaved >= SYNONYM_SAVE_EVERY
+    if due:
+        save_synonym_index()
+    return tuple(synonyms)
+
+def normalize_query(query):
+    return " ".join(query.split())
+
+@traced("vault.expand_query")
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
 def expand_query(query):
     """
     FR-02: CPU-Bound Query Expansion using WordNet.
     Ensures that if you search for 'funds', it can find 'budget'.
+    Deterministic: the same query always expands to the same string (and embedding).
     """
-    synonyms = {query}
+    expanded = [query]
     # Analyze each word for synonyms
     for word in query.split():
-        for syn in wordnet.synsets(word):
-            for lemma in syn.lemmas():
-                clean_syn = lemma.name().replace('_', ' ')
-                synonyms.add(clean_syn)
-                if len(synonyms) >= 5: 
-                    return " ".join(list(synonyms))
-    
-    return " ".join(list(synonyms))
+        for clean_syn in word_synonyms(word):
+            if clean_syn not in expanded:
+                expanded.append(clean_syn)
+                if len(expanded) >= EXPANSION_LIMIT:
+                    return " ".join(expanded)
 
-def query_vault(user_query):
+    return " ".join(expanded)
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def query_variants(query):
+    """
+    FR-02: The query, its legacy expansion string, and single-word synonym swaps
+    ('funds report' -> 'budget report'), capped at MAX_QUERY_VARIANTS. Deterministic.
+    """
+    variants = [query, expand_query(query)]
+    words = query.split()
+    for i, word in enumerate(words):
+        for clean_syn in word_synonyms(word)[:2]:
+            if len(variants) >= MAX_QUERY_VARIANTS:
+                return tuple(dict.fromkeys(variants))
+            if clean_syn.lower() != word.lower():
+                variants.append(" ".join(words[:i] + [clean_syn] + words[i + 1:]))
+    return tuple(dict.fromkeys(variants))
+
+@traced("vault.embed_queries")
+def embed_queries(texts):
+    """
+    Memoised, batched query embeddings: texts not seen recently go through the
+    model in a single forward pass. Returns one tuple per input text.
+    """
+    unique = list(dict.fromkeys(texts))
+    with _embedding_lock:
+        found = {t: _embedding_cache[t] for t in unique if t in _embedding_cache}
+    missing = [t for t in unique if t not in found]
+    count("vault.query_embedding.miss", len(missing))
+    if missing:
+        vectors = get_embedding_function()(missing)
+        for text, vector in zip(missing, vectors):
+            found[text] = tuple(float(x) for x in vector)
+    # Results come from `found`, so another thread evicting an entry meanwhile can't break this call
+    with _embedding_lock:
+        for text in unique:
+            _embedding_cache[text] = found[text]
+            _embedding_cache.move_to_end(text)
+        while len(_embedding_cache) > QUERY_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    return [found[text] for text in texts]
+
+def embed_query(text):
+    """Memoised query embedding: repeated /vault queries skip the model forward pass."""
+    return embed_queries([text])[0]
+
+def fuse_results(results, top_k, k=RRF_K):
+    """
+    Reciprocal-rank fusion over the per-variant result lists of one vault.query.
+    Returns [{id, text, meta, distance, score}] best-first; distance is the best seen.
+    """
+    fused = {}
+    for ids, docs, metas, dists in zip(results['ids'], results['documents'],
+                                       results['metadatas'], results['distances']):
+        for rank, (doc_id, doc, meta, dist) in enumerate(zip(ids, docs, metas, dists)):
+            hit = fused.setdefault(doc_id, {"id": doc_id, "text": doc, "meta": meta or {},
+                                            "distance": dist, "score": 0.0})
+            hit["score"] += 1.0 / (k + rank + 1)
+            hit["distance"] = min(hit["distance"], dist)
+    ranked = sorted(fused.values(), key=lambda h: (-h["score"], h["distance"]))
+    return ranked[:top_k]
+
+def rerank_hits(query, hits):
+    """Orders the leading candidates by cross-encoder relevance; the rest keep fused order."""
+    reranker = get_reranker()
+    if reranker is None or len(hits) < 2:
+        return hits
+    head, tail = hits[:RERANK_CANDIDATES], hits[RERANK_CANDIDATES:]
+    scores = reranker.predict([(query, hit["text"]) for hit in head])
+    for hit, score in zip(head, scores):
+        hit["rerank"] = float(score)
+    return sorted(head, key=lambda h: -h["rerank"]) + tail
+
+@traced("vault.search")
+def search_vault(user_query, top_k=VAULT_TOP_K, rerank=None, verbose=True):
+    """
+    Ranked Tier 3 hits for user_query: every variant is embedded in one batch and
+    searched in one multi-query vault.query, then fused (RRF) and optionally re-ranked.
+    FR-03: only chunks whose best distance passes DISTANCE_GATE are returned.
+    """
+    query = normalize_query(user_query)
+    variants = query_variants(query)
+
+    results = get_vault().query(
+        query_embeddings=[list(v) for v in embed_queries(list(variants))],
+        n_results=top_k
+    )
+    if not any(results['ids']):
+        return []
+
+    fused = fuse_results(results, max(top_k, RERANK_CANDIDATES))
+    # 0.5 Threshold Gatekeeper: Prevents Hallucinations
+    hits = [h for h in fused if h["distance"] <= DISTANCE_GATE]
+    if not hits:
+        best = min(h["distance"] for h in fused)
+        if verbose:
+            print(f"[*] Gatekeeper: Best vault match too weak ({best:.4f} > {DISTANCE_GATE}). Ignoring.")
+        return []
+    if RERANK if rerank is None else rerank:
+        hits = rerank_hits(query, hits)
+    return hits[:top_k]
+
+@traced("vault.query_vault")
+def query_vault(user_query, top_k=VAULT_TOP_K, token_budget=VAULT_TOKEN_BUDGET, rerank=None, verbose=True):
     """
     Final Phase 4 Version: Implements FR-03 (Gatekeeper) and returns 
     the best matching structured dictionary for FR-16 Orchestration.
+    Retrieves the fused top-k chunks and merges adjacent ones within token_budget.
     """
-    # Step 1: Query Expansion (FR-02)
-    search_query = expand_query(user_query)
-    
-    # Step 2: Semantic Search (Requesting 1 best match for the orchestrator)
-    results = vault.query(
-        query_texts=[search_query],
-        n_results=1
-    )
+    hits = search_vault(user_query, top_k, rerank, verbose)
+    if not hits:
+        return None # Returns None if nothing is relevant
+
+    passages = merge_chunks([(h["text"], h["meta"], h["distance"]) for h in hits], token_budget)
+
+    # FR-16: Force the timestamp to a float for easier comparison
+    # Default to 0.0 (Unix Epoch) if missing
+    timestamps = [float(p["meta"].get("timestamp", 0)) for p in passages]
+    origins = list(dict.fromkeys(p["meta"].get("source_origin", "Unknown") for p in passages))
 
-    # Step 3: Gatekeeper Logic (FR-03)
-    if results['distances'] and len(results['distances'][0]) > 0:
-        distance = results['distances'][0][0]
-        
-        # 0.5 Threshold Gatekeeper: Prevents Hallucinations
-        if distance <= 0.5:
-            content = results['documents'][0][0]
-            meta = results['metadatas'][0][0]
-            
-            # FR-16: Force the timestamp to a float for easier comparison
-            # Default to 0.0 (Unix Epoch) if missing
-            raw_ts = meta.get("timestamp", 0)
-            
-            # Return the dictionary format main.py is waiting for
-            return {
-                "content": content,
-                "timestamp": float(raw_ts), 
-                "source": f"Tier 3 Vault ({meta.get('source_origin', 'Unknown')})",
-                "distance": distance
-            }
-        else:
-            print(f"[*] Gatekeeper: Best vault match too weak ({distance:.4f} > 0.5). Ignoring.")
-
-    return None # Returns None if nothing is relevant
\ No newline at end of file
+    # Return the dictionary format main.py is waiting for
+    labelled = [f"[{p['meta'].get('source_origin', 'Unknown')}] {p['text']}" for p in passages]
+    return {
+        "content": "\n\n".join(labelled),
+        "passages": labelled, # Ranked, for the context packer
+        "timestamp": max(timestamps),
+        "source": f"Tier 3 Vault ({', '.join(origins)})",
+        "distance": min(h["distance"] for h in hits),
+        "tokens": sum(p["tokens"] for p in passages)
+    }